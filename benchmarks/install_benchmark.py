@@ -0,0 +1,376 @@
+# SPDX-FileCopyrightText: 2022-present Manuel Quarneti <manuelquarneti@gmail.com>
+#
+# SPDX-License-Identifier: GPL-3.0-only
+
+"""
+Offline install benchmark.
+
+Starts a local stand-in for Mojang's CDN serving a synthetic version
+manifest, version meta, asset index and libraries, points the launcher's
+mirrors at it and measures install_version and download_file against it.
+
+    python -m benchmarks.install_benchmark --latency 20 --bandwidth 50
+    python -m benchmarks.install_benchmark --baseline benchmarks/results/old.json
+"""
+
+import argparse
+import hashlib
+import json
+import multiprocessing
+import platform
+import random
+import re
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from os import makedirs, path
+from typing import Any, Callable, Optional
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None  # type: ignore
+
+VERSION_ID = "benchmark"
+LARGE_FILE_SIZE = 32 * 1024 * 1024
+REGRESSION_THRESHOLD = 0.10
+
+
+def _generate_files(
+    assets: int, libraries: int, client_size: int, seed: int
+) -> dict[str, bytes]:
+    """
+    Returns the files served by the fake CDN, keyed by URL path
+    """
+    rng = random.Random(seed)
+    files: dict[str, bytes] = {}
+
+    def add(url_path: str, data: bytes) -> str:
+        files[url_path] = data
+        return hashlib.sha1(data).hexdigest()
+
+    # Asset sizes are log-uniform between 100 bytes and 256kb, like the
+    # mix of small json/lang files and larger sounds in the real index.
+    objects = {}
+    for i in range(assets):
+        data = rng.randbytes(int(10 ** rng.uniform(2, 5.4)))
+        sha1 = hashlib.sha1(data).hexdigest()
+        files[f"/assets/{sha1[:2]}/{sha1}"] = data
+        objects[f"minecraft/benchmark/{i}.ogg"] = {"hash": sha1, "size": len(data)}
+
+    index = json.dumps({"objects": objects}).encode()
+    index_sha1 = add(f"/versions/v1/packages/index/{VERSION_ID}.json", index)
+
+    library_list = []
+    for i in range(libraries):
+        library_path = f"org/benchmark/lib{i}/1.0/lib{i}-1.0.jar"
+        data = rng.randbytes(int(10 ** rng.uniform(4, 6.5)))
+        library_list.append(
+            {
+                "name": f"org.benchmark:lib{i}:1.0",
+                "downloads": {
+                    "artifact": {
+                        "path": library_path,
+                        "sha1": add(f"/libraries/{library_path}", data),
+                        "size": len(data),
+                        "url": f"https://libraries.minecraft.net/{library_path}",
+                    }
+                },
+            }
+        )
+
+    client = rng.randbytes(client_size)
+    client_sha1 = add("/versions/v1/objects/client/client.jar", client)
+
+    meta = {
+        "id": VERSION_ID,
+        "arguments": {"game": ["--username", "${auth_player_name}"]},
+        "assetIndex": {
+            "id": VERSION_ID,
+            "sha1": index_sha1,
+            "size": len(index),
+            "totalSize": sum(o["size"] for o in objects.values()),
+            "url": f"https://piston-meta.mojang.com/v1/packages/index/{VERSION_ID}.json",
+        },
+        "downloads": {
+            "client": {
+                "sha1": client_sha1,
+                "size": len(client),
+                "url": "https://piston-data.mojang.com/v1/objects/client/client.jar",
+            }
+        },
+        "javaVersion": {"component": "java-runtime-gamma"},
+        "libraries": library_list,
+        "mainClass": "net.minecraft.client.main.Main",
+    }
+    meta_sha1 = add(
+        f"/versions/v1/packages/meta/{VERSION_ID}.json", json.dumps(meta).encode()
+    )
+
+    manifest = {
+        "latest": {"release": VERSION_ID, "snapshot": VERSION_ID},
+        "versions": [
+            {
+                "id": VERSION_ID,
+                "type": "release",
+                "url": f"https://piston-meta.mojang.com/v1/packages/meta/{VERSION_ID}.json",
+                "sha1": meta_sha1,
+            }
+        ],
+    }
+    add("/versions/mc/game/version_manifest_v2.json", json.dumps(manifest).encode())
+
+    files["/large.bin"] = rng.randbytes(LARGE_FILE_SIZE)
+
+    return files
+
+
+def _serve(options: dict[str, Any], ready: Any, stats: Any) -> None:
+    files = _generate_files(
+        options["assets"], options["libraries"], options["client_size"], options["seed"]
+    )
+    latency = options["latency"] / 1000
+    bandwidth = options["bandwidth"] * 1024 * 1024
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args: Any) -> None:
+            pass
+
+        def do_GET(self) -> None:
+            with stats.get_lock():
+                stats[0] += 1
+
+            time.sleep(latency)
+
+            data = files.get(self.path.split("?")[0])
+            if data is None:
+                self.send_error(404)
+                return
+
+            start, end = 0, len(data) - 1
+            match = re.fullmatch(r"bytes=(\d+)-(\d*)", self.headers.get("Range", ""))
+            if match:
+                start = int(match[1])
+                end = int(match[2]) if match[2] else end
+                if start >= len(data):
+                    self.send_error(416)
+                    return
+                self.send_response(206)
+                self.send_header("Content-Range", f"bytes {start}-{end}/{len(data)}")
+            else:
+                self.send_response(200)
+
+            body = memoryview(data)[start : end + 1]
+            self.send_header("Content-Length", str(len(body)))
+            self.send_header("Accept-Ranges", "bytes")
+            self.end_headers()
+
+            # Throttle every connection to the configured bandwidth.
+            chunk_size = 16384
+            for offset in range(0, len(body), chunk_size):
+                chunk = body[offset : offset + chunk_size]
+                self.wfile.write(chunk)
+                if bandwidth:
+                    time.sleep(len(chunk) / bandwidth)
+
+            with stats.get_lock():
+                stats[1] += len(body)
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    ready.put(server.server_address[1])
+    server.serve_forever()
+
+
+class _ResourceMonitor:
+    """
+    Samples the thread count of this process while a scenario runs
+    """
+
+    def __init__(self) -> None:
+        self.peak_threads = 0
+        self._running = True
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self) -> None:
+        while self._running:
+            self.peak_threads = max(self.peak_threads, threading.active_count())
+            time.sleep(0.01)
+
+    def __enter__(self) -> "_ResourceMonitor":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        self._running = False
+        self._thread.join()
+
+
+def _get_peak_rss() -> Optional[int]:
+    if resource is None:
+        return None
+
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    # Linux reports kilobytes, macOS bytes.
+    return peak_rss if platform.system() == "Darwin" else peak_rss * 1024
+
+
+def _measure(stats: Any, scenario: Callable[[], Any]) -> dict[str, Any]:
+    with stats.get_lock():
+        stats[0] = stats[1] = 0
+
+    with _ResourceMonitor() as monitor:
+        started = time.perf_counter()
+        extra = scenario()
+        wall_time = time.perf_counter() - started
+
+    return {
+        "wall_time": wall_time,
+        "requests": stats[0],
+        "requests_per_second": stats[0] / wall_time,
+        "bytes": stats[1],
+        "bytes_per_second": stats[1] / wall_time,
+        "peak_rss": _get_peak_rss(),
+        "peak_threads": monitor.peak_threads,
+        **(extra or {}),
+    }
+
+
+def _run_scenarios(port: int, stats: Any, data_dir: str) -> dict[str, Any]:
+    # The launcher keeps its data and its cache in a throwaway directory, so
+    # the synthetic manifest never ends up in the real metadata cache.
+    import appdirs
+
+    cache_dir = path.join(data_dir, "cache")
+    appdirs.AppDirs.user_data_dir = property(lambda self: data_dir)  # type: ignore
+    appdirs.AppDirs.user_cache_dir = property(lambda self: cache_dir)  # type: ignore
+
+    with open(path.join(data_dir, "config.toml"), "w") as f:
+        f.write(
+            "[mirrors]\n"
+            f'assets = ["http://127.0.0.1:{port}/assets"]\n'
+            f'libraries = ["http://127.0.0.1:{port}/libraries"]\n'
+            f'versions = ["http://127.0.0.1:{port}/versions"]\n'
+        )
+
+    from ice_launcher.lib import ProgressCallbacks, download_file, minecraft_versions
+
+    callbacks = ProgressCallbacks(
+        set_max=lambda value: None,
+        increment_value_by=lambda value: None,
+        set_status=lambda status: None,
+        reset=lambda: None,
+    )
+    version = minecraft_versions.fetch_manifest().versions[0]
+
+    def install() -> dict[str, Any]:
+        return {
+            "install_stats": minecraft_versions.install_version(
+                version, callbacks
+            ).dict()
+        }
+
+    def download_large() -> None:
+        download_file(
+            f"http://127.0.0.1:{port}/large.bin",
+            path.join(data_dir, "large.bin"),
+            size=LARGE_FILE_SIZE,
+        )
+
+    return {
+        "install_version_cold": _measure(stats, install),
+        "install_version_warm": _measure(stats, install),
+        "download_file_large": _measure(stats, download_large),
+    }
+
+
+def _compare(results: dict[str, Any], baseline_path: str) -> bool:
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+
+    is_regression = False
+    for name, result in results["scenarios"].items():
+        if name not in baseline["scenarios"]:
+            continue
+
+        before = baseline["scenarios"][name]["wall_time"]
+        change = (result["wall_time"] - before) / before
+        print(f"{name}: {before:.2f}s -> {result['wall_time']:.2f}s ({change:+.1%})")
+        if change > REGRESSION_THRESHOLD:
+            is_regression = True
+
+    return is_regression
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--assets", type=int, default=4000)
+    parser.add_argument("--libraries", type=int, default=60)
+    parser.add_argument("--client-size", type=int, default=20 * 1024 * 1024)
+    parser.add_argument("--latency", type=float, default=0, help="per request, ms")
+    parser.add_argument(
+        "--bandwidth", type=float, default=0, help="per connection, mb/s"
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="defaults to benchmarks/results/")
+    parser.add_argument("--baseline", help="results to compare against")
+    args = parser.parse_args()
+
+    options = {
+        "assets": args.assets,
+        "libraries": args.libraries,
+        "client_size": args.client_size,
+        "latency": args.latency,
+        "bandwidth": args.bandwidth,
+        "seed": args.seed,
+    }
+
+    # The server lives in its own process so it doesn't skew RSS and threads.
+    ready: Any = multiprocessing.Queue()
+    stats: Any = multiprocessing.Array("q", 2)
+    server = multiprocessing.Process(
+        target=_serve, args=(options, ready, stats), daemon=True
+    )
+    server.start()
+    port = ready.get()
+
+    with tempfile.TemporaryDirectory() as data_dir:
+        scenarios = _run_scenarios(port, stats, data_dir)
+
+    server.terminate()
+
+    from ice_launcher.lib import __version__
+
+    results = {
+        "launcher_version": __version__,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "date": datetime.now().isoformat(timespec="seconds"),
+        "options": options,
+        "scenarios": scenarios,
+    }
+
+    output = args.output or path.join(
+        path.dirname(__file__),
+        "results",
+        f"{__version__}-{datetime.now():%Y%m%d-%H%M%S}.json",
+    )
+    makedirs(path.dirname(path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2)
+
+    print(json.dumps(scenarios, indent=2))
+    print(f"Results written to {output}")
+
+    if args.baseline and _compare(results, args.baseline):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+# SPDX-FileCopyrightText: 2022-present Manuel Quarneti <manuelquarneti@gmail.com>
+#
+# SPDX-License-Identifier: GPL-3.0-only
+
+import argparse
+import sys
+from typing import Optional
+
+from ice_launcher.lib import integrity, lan_mirror, minecraft_versions, store_gc
+
+
+def _verify(args: argparse.Namespace) -> int:
+    level = integrity.IntegrityLevel(args.level)
+
+    if args.repair:
+        report = integrity.repair_version(args.version, level)
+    else:
+        report = integrity.verify_version(args.version, level)
+
+    for download in report.failed:
+        print(f"FAILED {download.dest}")
+    if not report.is_jre_valid:
+        print("FAILED JRE")
+
+    if not report.is_jre_valid:
+        jre_status = "missing"
+    elif level == integrity.IntegrityLevel.full:
+        jre_status = "starts"
+    else:
+        jre_status = "present (only the full level runs it)"
+
+    print(
+        f"Checked {report.checked} files ({level.value}): "
+        f"{len(report.failed)} failed, JRE {jre_status}"
+    )
+    if args.repair:
+        return 0
+
+    return 1 if report.failed or not report.is_jre_valid else 0
+
+
+def _plan(args: argparse.Namespace) -> int:
+    version = minecraft_versions.fetch_version_index().get(args.version)
+    if version is None:
+        print(f"Unknown version {args.version}")
+        return 1
+
+    plan = minecraft_versions.plan_install(version)
+    if args.json:
+        print(plan.json(exclude={"downloads"} if not args.files else None))
+        return 0
+
+    if args.files:
+        for download in plan.downloads:
+            print(f"{download.size or '?':>10} {download.dest}")
+
+    print(
+        f"{version.id}: {len(plan.downloads)} of {plan.files} files to fetch, "
+        f"{plan.transfer_bytes / 1024 / 1024:.1f} MiB to download "
+        f"({plan.resumable_bytes / 1024 / 1024:.1f} MiB resumable), "
+        f"{plan.present_files} files already present"
+    )
+    return 0
+
+
+def _gc(args: argparse.Namespace) -> int:
+    report = store_gc.collect_garbage(dry_run=not args.delete)
+
+    if args.files:
+        for entry in report.unreferenced:
+            print(entry)
+
+    print(
+        f"{len(report.referenced_versions)} versions and {report.referenced_files} "
+        f"files in use, {len(report.unreferenced)} unreferenced "
+        f"({report.unreferenced_bytes / 1024 / 1024:.1f} MiB)"
+        + (" removed" if report.removed else ", run with --delete to remove them")
+    )
+    return 0
+
+
+def _serve(args: argparse.Namespace) -> int:
+    lan_mirror.serve(args.host, args.port)
+    return 0
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    """
+    Headless commands, meant for scripts and fleet management
+    """
+    parser = argparse.ArgumentParser(prog="ice-launcher")
+    subparsers = parser.add_subparsers(required=True)
+
+    verify_parser = subparsers.add_parser(
+        "verify", help="check the files of an installed version"
+    )
+    verify_parser.add_argument("version")
+    verify_parser.add_argument(
+        "--level",
+        choices=[level.value for level in integrity.IntegrityLevel],
+        default=integrity.IntegrityLevel.standard.value,
+    )
+    verify_parser.add_argument(
+        "--repair", action="store_true", help="download again what failed"
+    )
+    verify_parser.set_defaults(command=_verify)
+
+    plan_parser = subparsers.add_parser(
+        "plan", help="show what installing a version would download"
+    )
+    plan_parser.add_argument("version")
+    plan_parser.add_argument(
+        "--files", action="store_true", help="list the files to fetch"
+    )
+    plan_parser.add_argument("--json", action="store_true")
+    plan_parser.set_defaults(command=_plan)
+
+    gc_parser = subparsers.add_parser(
+        "gc", help="find the files no instance uses anymore"
+    )
+    gc_parser.add_argument("--delete", action="store_true", help="remove them")
+    gc_parser.add_argument(
+        "--files", action="store_true", help="list the unreferenced files"
+    )
+    gc_parser.set_defaults(command=_gc)
+
+    serve_parser = subparsers.add_parser(
+        "serve", help="serve the store to other launchers on the network"
+    )
+    serve_parser.add_argument("--host", default="0.0.0.0")
+    serve_parser.add_argument("--port", type=int, default=lan_mirror.DEFAULT_PORT)
+    serve_parser.set_defaults(command=_serve)
+
+    args = parser.parse_args(argv)
+    sys.exit(args.command(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -3,14 +3,10 @@
 # SPDX-License-Identifier: GPL-3.0-only
 
 
-import hashlib
-import lzma
 import os
-import stat
-from os import chmod, makedirs, path, remove
-from typing import Callable, Final, Optional
+from os import makedirs, path
+from typing import Callable, Final
 
-import httpx
 from appdirs import AppDirs
 from pydantic import BaseModel
 
@@ -28,6 +24,10 @@ CONFIG_PATH: Final[str] = path.join(dirs.user_data_dir, "config.toml")
 VERSION_MANIFESTS_DIR: Final[str] = path.join(dirs.user_data_dir, "versions")
 ACCOUNTS_FILE_PATH: Final[str] = path.join(dirs.user_data_dir, "accounts.toml")
 INSTANCES_DIR: Final[str] = path.join(dirs.user_data_dir, "instances")
+VERIFICATION_INDEX_PATH: Final[str] = path.join(dirs.user_data_dir, "verified.sqlite3")
+LOCKS_DIR: Final[str] = path.join(dirs.user_data_dir, "locks")
+NATIVES_DIR: Final[str] = path.join(dirs.user_data_dir, "natives")
+METADATA_CACHE_DIR: Final[str] = path.join(dirs.user_cache_dir, "metadata")
 
 
 headers = {
@@ -35,58 +35,29 @@ headers = {
 }
 
 
+def write_atomic(file_path: str, *chunks: bytes) -> None:
+    """
+    Writes chunks to a file aside and renames it over file_path, so readers
+    and crashes never leave half a file
+    """
+    with open(f"{file_path}.tmp", "wb") as f:
+        for chunk in chunks:
+            f.write(chunk)
+    os.replace(f"{file_path}.tmp", file_path)
+
+
 class ProgressCallbacks(BaseModel):
     set_max: Callable[[int], None]
     increment_value_by: Callable[[int], None]
+    increment_files_by: Callable[[int], None] = lambda value: None
     set_status: Callable[[str], None]
     reset: Callable[[], None]
 
 
-def download_file(
-    url: str,
-    dest: str,
-    sha1hash: Optional[str] = None,
-    callbacks: Optional[ProgressCallbacks] = None,
-    is_lzma: bool = False,
-    set_executable: bool = False,
-) -> None:
-    # If the file already exists, we check if the hash matches.
-    if path.exists(dest):
-        print(f"File {dest} already exists, checking hash...")
-
-        if sha1hash:
-            sha1 = hashlib.sha1()
-
-            with open(dest, "rb") as f:
-                while chunk := f.read(65536):  # Read 64kb chunks.
-                    sha1.update(chunk)
-
-            if sha1.hexdigest() == sha1hash:
-                if callbacks:
-                    file_size = path.getsize(dest)
-                    callbacks.increment_value_by(file_size)
-
-                print(f"{dest} Hash matches, skipping download.")
-                return
-
-        print(f"{dest} Hash does not match, redownloading.")
-        remove(dest)
-
-    print("Downloading file from", url, "to", dest)
-
-    with open(dest, "wb") as file:
-        with httpx.stream("GET", url, headers=headers) as response:
-            for chunk in response.iter_bytes(65536):  # Read 64kb chunks.
-                if callbacks:
-                    callbacks.increment_value_by(len(chunk))
-
-                if is_lzma:
-                    chunk = lzma.decompress(chunk)
-
-                file.write(chunk)
-
-    print(f"Downloaded {dest}")
-
-    if set_executable:
-        st = os.stat(dest)
-        chmod(dest, st.st_mode | stat.S_IEXEC)
+# The download engine depends on the definitions above.
+from .downloader import (  # noqa: E402
+    Download,
+    DownloadPriority,
+    download_file,
+    submit_downloads,
+)
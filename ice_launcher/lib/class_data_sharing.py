@@ -0,0 +1,141 @@
+# SPDX-FileCopyrightText: 2022-present Manuel Quarneti <manuelquarneti@gmail.com>
+#
+# SPDX-License-Identifier: GPL-3.0-only
+
+import hashlib
+import os
+import re
+import time
+from os import listdir, makedirs, path, remove
+from typing import IO, Any, Callable, Final, Optional
+
+from pydantic import BaseModel
+
+from . import INSTANCES_DIR
+
+CDS_DIR_NAME: Final[str] = "cds"
+MIN_JAVA_VERSION: Final[int] = 13  # first with -XX:ArchiveClassesAtExit
+TIMES_FILE: Final[str] = "startup_times.json"
+
+# Logged once the game window is up, by 1.13+ and by older versions.
+STARTUP_MARKER: Final[re.Pattern[bytes]] = re.compile(
+    rb"Backend library:|LWJGL Version:"
+)
+
+
+class StartupTimes(BaseModel):
+    archive: str
+    cold: Optional[float] = None  # seconds, without the archive
+    warm: Optional[float] = None  # seconds, with the archive
+
+
+def _get_java_version(java_path: str) -> Optional[int]:
+    # JREs are unpacked in dirs like jdk-17.0.5+8-jre or jdk8u352-b08-jre.
+    versions = re.findall(r"jdk-?(\d+)", java_path)
+
+    return int(versions[-1]) if versions else None
+
+
+def get_archive_path(
+    instance_name: str, java_path: str, classpath: str
+) -> Optional[str]:
+    """
+    Returns where the class data archive of an instance goes, or None if
+    its JRE can't create one. Archives made for another classpath or JRE
+    are deleted.
+    """
+    java_version = _get_java_version(java_path)
+    if java_version is None or java_version < MIN_JAVA_VERSION:
+        return None
+
+    # An updated JRE keeps its path only if it's the same version, so the
+    # binary itself is part of the key too.
+    java_stat = os.stat(java_path)
+    key = hashlib.sha1(
+        f"{java_path}\0{java_stat.st_size}\0{java_stat.st_mtime_ns}\0{classpath}".encode()
+    ).hexdigest()
+
+    cds_dir = path.join(INSTANCES_DIR, instance_name, CDS_DIR_NAME)
+    makedirs(cds_dir, exist_ok=True)
+    archive_path = path.join(cds_dir, f"{key}.jsa")
+
+    for file in listdir(cds_dir):
+        file_path = path.join(cds_dir, file)
+        if file.endswith(".jsa") and file_path != archive_path:
+            print(f"Removing outdated class data archive {file_path}")
+            remove(file_path)
+
+    return archive_path
+
+
+def get_jvm_arguments(archive_path: str) -> list[str]:
+    """
+    The first run dumps the loaded classes at exit, the next ones map them
+    """
+    if path.isfile(archive_path):
+        return [f"-XX:SharedArchiveFile={archive_path}"]
+
+    return [f"-XX:ArchiveClassesAtExit={archive_path}"]
+
+
+def _get_times_path(archive_path: str) -> str:
+    return path.join(path.dirname(archive_path), TIMES_FILE)
+
+
+def record_startup(archive_path: str, is_warm: bool, duration: float) -> None:
+    """
+    Saves how long the game took to start and prints it next to the
+    other kind of start
+    """
+    times_path = _get_times_path(archive_path)
+    archive = path.basename(archive_path)
+
+    times = StartupTimes(archive=archive)
+    if path.exists(times_path):
+        saved_times = StartupTimes.parse_file(times_path)
+        if saved_times.archive == archive:
+            times = saved_times
+
+    if is_warm:
+        times.warm = duration
+    else:
+        times.cold = duration
+
+    with open(times_path, "w") as f:
+        f.write(times.json())
+
+    message = f"Game started in {duration:.2f}s"
+    if is_warm and times.cold is not None:
+        message += f" with class data sharing (without: {times.cold:.2f}s)"
+    elif not is_warm and times.warm is not None:
+        message += f" without class data sharing (with: {times.warm:.2f}s)"
+    print(message)
+
+
+class StartupTimer:
+    """
+    Wraps the stdout of the game and calls on_started with the seconds since
+    started_at when the startup marker is logged
+    """
+
+    def __init__(
+        self,
+        stdout: IO[bytes],
+        started_at: float,
+        on_started: Callable[[float], None],
+    ) -> None:
+        self.stdout = stdout
+        self.started_at = started_at
+        self.on_started = on_started
+        self.is_started = False
+
+    def readline(self, *args: Any) -> bytes:
+        line = self.stdout.readline(*args)
+        if not self.is_started and STARTUP_MARKER.search(line):
+            self.is_started = True
+            self.on_started(time.monotonic() - self.started_at)
+
+        return line
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.stdout, name)
@@ -0,0 +1,98 @@
+# SPDX-FileCopyrightText: 2022-present Manuel Quarneti <manuelquarneti@gmail.com>
+#
+# SPDX-License-Identifier: GPL-3.0-only
+
+import asyncio
+import time
+from typing import Final
+
+MIN_CONCURRENCY: Final[int] = 4
+INITIAL_CONCURRENCY: Final[int] = 16
+ADDITIVE_INCREASE: Final[int] = 2
+MULTIPLICATIVE_DECREASE: Final[float] = 0.75
+CONTROL_INTERVAL: Final[float] = 1.0  # seconds
+LATENCY_TOLERANCE: Final[float] = 2.0
+SMALL_DOWNLOAD_SIZE: Final[int] = 65536  # 64kb
+
+
+class ConcurrencyController:
+    """
+    Picks how many downloads run at once using AIMD: while throughput keeps
+    growing and small requests stay fast the limit goes up by
+    ADDITIVE_INCREASE every CONTROL_INTERVAL, and on errors, rising latency or
+    falling throughput it is cut by MULTIPLICATIVE_DECREASE.
+
+    The latency signal comes from small downloads only, whose duration is
+    dominated by round trips rather than by bandwidth.
+    """
+
+    def __init__(self, maximum: int) -> None:
+        self.maximum = maximum
+        self.limit = min(INITIAL_CONCURRENCY, maximum)
+        self.peak_limit = self.limit
+        self.in_flight = 0
+        self.condition = asyncio.Condition()
+
+        self.best_latency = float("inf")
+        self.previous_throughput = 0.0
+        self._reset_window()
+
+    def _reset_window(self) -> None:
+        self.window_started = time.monotonic()
+        self.window_bytes = 0
+        self.window_errors = 0
+        self.window_latencies: list[float] = []
+        self.window_saturated = False
+
+    def reset_peak(self) -> None:
+        self.peak_limit = self.limit
+
+    async def acquire(self) -> None:
+        async with self.condition:
+            await self.condition.wait_for(lambda: self.in_flight < self.limit)
+            self.in_flight += 1
+
+            if self.in_flight >= self.limit:
+                self.window_saturated = True
+
+    async def release(self, received: int, duration: float, failed: bool) -> None:
+        async with self.condition:
+            self.in_flight -= 1
+
+            self.window_bytes += received
+            if failed:
+                self.window_errors += 1
+            elif 0 < received <= SMALL_DOWNLOAD_SIZE:
+                self.window_latencies.append(duration)
+
+            self._adjust()
+            self.condition.notify_all()
+
+    def _adjust(self) -> None:
+        elapsed = time.monotonic() - self.window_started
+        if elapsed < CONTROL_INTERVAL:
+            return
+
+        throughput = self.window_bytes / elapsed
+        latency = None
+        if self.window_latencies:
+            latency = sum(self.window_latencies) / len(self.window_latencies)
+            self.best_latency = min(self.best_latency, latency)
+
+        is_congested = self.window_errors > 0 or (
+            latency is not None and latency > self.best_latency * LATENCY_TOLERANCE
+        )
+        is_slower = (
+            self.window_saturated
+            and throughput < self.previous_throughput * MULTIPLICATIVE_DECREASE
+        )
+
+        if is_congested or is_slower:
+            self.limit = max(MIN_CONCURRENCY, int(self.limit * MULTIPLICATIVE_DECREASE))
+        elif self.window_saturated:
+            # Only grow when the current limit is actually being used.
+            self.limit = min(self.maximum, self.limit + ADDITIVE_INCREASE)
+
+        self.peak_limit = max(self.peak_limit, self.limit)
+        self.previous_throughput = throughput
+        self._reset_window()
@@ -0,0 +1,70 @@
+# SPDX-FileCopyrightText: 2022-present Manuel Quarneti <manuelquarneti@gmail.com>
+#
+# SPDX-License-Identifier: GPL-3.0-only
+
+import asyncio
+import random
+import time
+from typing import Final
+
+import httpx
+
+MAX_REQUESTS_PER_HOST: Final[int] = 32
+MAX_RETRIES: Final[int] = 4
+RETRY_BASE_DELAY: Final[float] = 0.5  # seconds
+RETRY_MAX_DELAY: Final[float] = 8.0  # seconds
+CIRCUIT_BREAKER_THRESHOLD: Final[int] = 8
+CIRCUIT_BREAKER_COOLDOWN: Final[float] = 30.0  # seconds
+
+
+class CircuitOpenError(Exception):
+    pass
+
+
+def is_transient(error: Exception) -> bool:
+    """
+    Returns True for errors that are worth retrying against the same host
+    """
+    if isinstance(error, httpx.TransportError):
+        return True
+    if isinstance(error, httpx.HTTPStatusError):
+        status_code = error.response.status_code
+        return status_code == 429 or status_code >= 500
+
+    return False
+
+
+def get_retry_delay(attempt: int) -> float:
+    """
+    Exponential backoff with full jitter
+    """
+    return random.uniform(0, min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2**attempt))
+
+
+class HostPolicy:
+    """
+    Limits the requests in flight to a single host and stops sending it any
+    after CIRCUIT_BREAKER_THRESHOLD consecutive failures, until
+    CIRCUIT_BREAKER_COOLDOWN has passed.
+    """
+
+    def __init__(self, host: str) -> None:
+        self.host = host
+        self.semaphore = asyncio.Semaphore(MAX_REQUESTS_PER_HOST)
+        self.consecutive_failures = 0
+        self.open_until = 0.0
+
+    def check(self) -> None:
+        if time.monotonic() < self.open_until:
+            raise CircuitOpenError(f"{self.host} is failing, not sending requests")
+
+    def record_success(self) -> None:
+        self.consecutive_failures = 0
+
+    def record_failure(self) -> None:
+        self.consecutive_failures += 1
+
+        is_open = time.monotonic() < self.open_until
+        if self.consecutive_failures >= CIRCUIT_BREAKER_THRESHOLD and not is_open:
+            print(f"Too many failures from {self.host}, pausing requests")
+            self.open_until = time.monotonic() + CIRCUIT_BREAKER_COOLDOWN
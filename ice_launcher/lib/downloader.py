@@ -0,0 +1,779 @@
+# SPDX-FileCopyrightText: 2022-present Manuel Quarneti <manuelquarneti@gmail.com>
+#
+# SPDX-License-Identifier: GPL-3.0-only
+
+import asyncio
+import hashlib
+import itertools
+import json
+import lzma
+import os
+import stat
+import time
+from concurrent.futures import Future
+from enum import IntEnum
+from os import chmod, makedirs, path, remove
+from threading import Lock, Thread, local
+from typing import Final, Optional
+
+import httpx
+from pydantic import BaseModel
+
+from . import ProgressCallbacks, headers, mirrors, verification_index, write_atomic
+from .download_concurrency import ConcurrencyController
+from .download_policy import (
+    MAX_RETRIES,
+    CircuitOpenError,
+    HostPolicy,
+    get_retry_delay,
+    is_transient,
+)
+from .file_lock import FileLock
+
+CHUNK_SIZE: Final[int] = 65536  # 64kb
+MAX_PARALLEL_DOWNLOADS: Final[int] = 64
+MAX_CONNECTIONS: Final[int] = 16
+SEGMENTED_DOWNLOAD_THRESHOLD: Final[int] = 16 * 1024 * 1024  # 16mb
+SEGMENT_COUNT: Final[int] = 4
+SEGMENTS_SAVE_INTERVAL: Final[float] = 1.0  # seconds
+MIRROR_GRACE_PERIOD: Final[float] = 5.0  # seconds
+MIN_MIRROR_THROUGHPUT: Final[int] = 32 * 1024  # 32kb/s
+
+
+_buffers = local()
+
+
+class _RangeNotSupported(Exception):
+    pass
+
+
+class _SlowMirror(Exception):
+    pass
+
+
+class _IntegrityError(Exception):
+    pass
+
+
+class _ThroughputGuard:
+    """
+    Aborts a transfer that stays below MIN_MIRROR_THROUGHPUT for longer than
+    MIRROR_GRACE_PERIOD, as long as there is another mirror to fail over to
+    """
+
+    def __init__(self, can_failover: bool) -> None:
+        self.can_failover = can_failover
+        self.started = time.monotonic()
+        self.received = 0
+
+    def update(self, size: int) -> None:
+        self.received += size
+        if not self.can_failover:
+            return
+
+        elapsed = time.monotonic() - self.started
+        if elapsed > MIRROR_GRACE_PERIOD:
+            throughput = self.received / elapsed
+            if throughput < MIN_MIRROR_THROUGHPUT:
+                raise _SlowMirror(f"only {throughput / 1024:.1f} kb/s")
+
+
+class _ProgressReporter:
+    """
+    Reports the bytes of a single download to callbacks, counting each byte
+    once even when a retry or a mirror failover goes over it again
+    """
+
+    def __init__(self, callbacks: Optional[ProgressCallbacks]) -> None:
+        self.callbacks = callbacks
+        self.position = 0
+        self.reported = 0
+
+    def seek(self, position: int) -> None:
+        self.position = position
+        self._report()
+
+    def advance(self, size: int) -> None:
+        self.position += size
+        self._report()
+
+    def _report(self) -> None:
+        if self.callbacks and self.position > self.reported:
+            self.callbacks.increment_value_by(self.position - self.reported)
+            self.reported = self.position
+
+
+class DownloadPriority(IntEnum):
+    critical = 0
+    libraries = 1
+    assets = 2
+
+
+class Download(BaseModel):
+    url: str
+    dest: str
+    sha1hash: Optional[str] = None
+    sha256hash: Optional[str] = None
+    size: Optional[int] = None
+    priority: DownloadPriority = DownloadPriority.critical
+    is_lzma: bool = False
+    set_executable: bool = False
+
+
+def _get_buffer() -> memoryview:
+    """
+    Returns a read buffer that is reused by every hash computed on this thread
+    """
+    if not hasattr(_buffers, "buffer"):
+        _buffers.buffer = memoryview(bytearray(CHUNK_SIZE))
+
+    return _buffers.buffer
+
+
+def _hash_file(file_path: str, name: str = "sha1") -> "hashlib._Hash":
+    digest = hashlib.new(name)
+    buffer = _get_buffer()
+
+    with open(file_path, "rb") as f:
+        while size := f.readinto(buffer):
+            digest.update(buffer[:size])
+
+    return digest
+
+
+def _file_sha1(file_path: str) -> str:
+    return _hash_file(file_path).hexdigest()
+
+
+def _file_sha256(file_path: str) -> str:
+    return _hash_file(file_path, "sha256").hexdigest()
+
+
+def _save_segments(segments_path: str, segments: list[int]) -> None:
+    write_atomic(segments_path, json.dumps(segments).encode())
+
+
+def _load_segments(segments_path: str, bounds: list[tuple[int, int]]) -> list[int]:
+    """
+    Returns the bytes already written to each range, or zeros if the sidecar
+    doesn't describe these ranges
+    """
+    try:
+        with open(segments_path) as f:
+            segments = json.load(f)
+    except ValueError:
+        segments = None
+
+    if (
+        isinstance(segments, list)
+        and len(segments) == len(bounds)
+        and all(
+            isinstance(done, int) and 0 <= done <= end - start + 1
+            for done, (start, end) in zip(segments, bounds)
+        )
+    ):
+        return segments
+
+    print(f"Ignoring broken segments file {segments_path}")
+    return [0] * len(bounds)
+
+
+def _discard_part(part_path: str) -> None:
+    remove(part_path)
+    if path.exists(f"{part_path}.segments"):
+        remove(f"{part_path}.segments")
+
+
+async def _keep_segments_saved(segments_path: str, segments: list[int]) -> None:
+    while True:
+        await asyncio.sleep(SEGMENTS_SAVE_INTERVAL)
+        _save_segments(segments_path, segments)
+
+
+class _DownloadEngine:
+    """
+    Runs every download on a single asyncio event loop living in a background
+    thread, sharing one pooled HTTP/2 client across all of them.
+
+    Queued downloads are started by priority class first and by size second,
+    so large transfers begin early and small files fill in the gaps.
+
+    Only one transfer per destination runs at a time: requests for a file
+    that is already being downloaded, here or by another launcher process,
+    wait for it and then find the finished file on disk.
+    """
+
+    def __init__(self) -> None:
+        self.loop = asyncio.new_event_loop()
+        self.client = httpx.AsyncClient(
+            headers=headers,
+            http2=True,
+            follow_redirects=True,
+            limits=httpx.Limits(
+                max_connections=MAX_CONNECTIONS,
+                max_keepalive_connections=MAX_CONNECTIONS,
+            ),
+            timeout=httpx.Timeout(30, pool=None),
+        )
+        self.queue: Optional[asyncio.PriorityQueue] = None
+        self.controller = ConcurrencyController(maximum=MAX_PARALLEL_DOWNLOADS)
+        self.counter = itertools.count()
+        self.policies: dict[str, HostPolicy] = {}
+        self.in_flight: dict[str, asyncio.Future[Optional[Download]]] = {}
+
+        Thread(
+            target=self.loop.run_forever, name="ice-launcher-downloads", daemon=True
+        ).start()
+
+    def _enqueue(self, items: list[tuple]) -> None:
+        if self.queue is None:
+            self.queue = asyncio.PriorityQueue()
+            for _ in range(MAX_PARALLEL_DOWNLOADS):
+                self.loop.create_task(self._worker())
+
+        for item in items:
+            self.queue.put_nowait(item)
+
+    async def _worker(self) -> None:
+        while True:
+            *_, download, callbacks, future = await self.queue.get()  # type: ignore
+
+            if not future.set_running_or_notify_cancel():
+                continue
+
+            key = path.abspath(download.dest)
+            finished = None
+            while key in self.in_flight:
+                finished = await self.in_flight[key]
+
+            # The same file was just downloaded by another request.
+            if (
+                finished
+                and finished.sha1hash == download.sha1hash
+                and finished.sha256hash == download.sha256hash
+            ):
+                if callbacks:
+                    callbacks.increment_value_by(download.size or 0)
+                    callbacks.increment_files_by(1)
+                future.set_result(0)
+                continue
+
+            # Other requests for the same file in this process wait on
+            # in_flight, the file lock only keeps other processes out.
+            self.in_flight[key] = self.loop.create_future()
+            lock = FileLock(key)
+            has_slot = False
+            started = time.monotonic()
+            received = 0
+
+            try:
+                if not lock.try_acquire():
+                    print(f"Waiting for another launcher to download {download.dest}")
+                    await lock.acquire()
+
+                # The controller decides how many of the workers may run at once.
+                await self.controller.acquire()
+                has_slot = True
+                started = time.monotonic()
+
+                received = await self.download(
+                    download.url,
+                    download.dest,
+                    download.sha1hash,
+                    download.sha256hash,
+                    download.size,
+                    callbacks,
+                    download.is_lzma,
+                    download.set_executable,
+                )
+            except Exception as e:
+                future.set_exception(e)
+            else:
+                if callbacks:
+                    callbacks.increment_files_by(1)
+                future.set_result(received)
+            finally:
+                failed = future.exception() is not None
+                if has_slot:
+                    duration = time.monotonic() - started
+                    await self.controller.release(received, duration, failed)
+
+                # Waiting requests get the download back if it succeeded.
+                lock.release()
+                self.in_flight.pop(key).set_result(None if failed else download)
+
+    def submit(
+        self, downloads: list[Download], callbacks: Optional[ProgressCallbacks]
+    ) -> list["Future[int]"]:
+        items = []
+        futures: list["Future[int]"] = []
+        for download in downloads:
+            future: "Future[int]" = Future()
+            futures.append(future)
+
+            # The counter keeps the queue stable and never compares downloads.
+            items.append(
+                (
+                    download.priority,
+                    -(download.size or 0),
+                    next(self.counter),
+                    download,
+                    callbacks,
+                    future,
+                )
+            )
+
+        # Everything is queued at once, so the batch is ordered as a whole.
+        self.loop.call_soon_threadsafe(self._enqueue, items)
+
+        return futures
+
+    async def _fetch(
+        self,
+        url: str,
+        part_path: str,
+        size: Optional[int],
+        progress: _ProgressReporter,
+        is_lzma: bool,
+        guard: _ThroughputGuard,
+    ) -> tuple[str, int]:
+        """
+        Streams url into part_path, decompressing and hashing on the fly.
+        Returns the SHA-1 of the written file and the number of bytes received.
+        """
+        offset = path.getsize(part_path) if path.exists(part_path) else 0
+
+        # Decompressed output can't be mapped back to a byte range.
+        if is_lzma or (size is not None and offset > size):
+            offset = 0
+
+        if offset:
+            sha1 = await self.loop.run_in_executor(None, _hash_file, part_path)
+        else:
+            sha1 = hashlib.sha1()
+
+        if size is not None and offset == size:
+            print(f"{part_path} is already complete")
+            progress.seek(offset)
+            return sha1.hexdigest(), offset
+
+        request_headers = {"Range": f"bytes={offset}-"} if offset else {}
+
+        async with self.client.stream("GET", url, headers=request_headers) as response:
+            if response.status_code == 416:
+                # The partial file doesn't fit the remote one anymore.
+                remove(part_path)
+                await response.aclose()
+                return await self._fetch(url, part_path, size, progress, is_lzma, guard)
+
+            response.raise_for_status()
+
+            # Servers that ignore Range send the whole file again.
+            if response.status_code != 206:
+                offset = 0
+                sha1 = hashlib.sha1()
+
+            if offset:
+                print(f"Resuming {part_path} from byte {offset}")
+            progress.seek(offset)
+
+            decompressor = lzma.LZMADecompressor() if is_lzma else None
+            received = offset
+
+            with open(part_path, "ab" if offset else "wb") as file:
+                async for chunk in response.aiter_bytes(CHUNK_SIZE):
+                    received += len(chunk)
+                    guard.update(len(chunk))
+                    progress.advance(len(chunk))
+
+                    if decompressor:
+                        chunk = decompressor.decompress(chunk)
+
+                    sha1.update(chunk)
+                    file.write(chunk)
+
+            if decompressor and not decompressor.eof:
+                raise _IntegrityError(f"Truncated LZMA stream from {url}")
+
+        return sha1.hexdigest(), received
+
+    async def _fetch_segment(
+        self,
+        url: str,
+        part_path: str,
+        start: int,
+        end: int,
+        segments: list[int],
+        index: int,
+        progress: _ProgressReporter,
+        guard: _ThroughputGuard,
+    ) -> None:
+        offset = start + segments[index]
+        if offset > end:
+            return
+
+        request_headers = {"Range": f"bytes={offset}-{end}"}
+
+        async with self.client.stream("GET", url, headers=request_headers) as response:
+            response.raise_for_status()
+
+            if response.status_code != 206:
+                raise _RangeNotSupported()
+
+            # Unbuffered, so the sidecar never counts bytes that are
+            # still in memory.
+            with open(part_path, "r+b", buffering=0) as file:
+                file.seek(offset)
+
+                async for chunk in response.aiter_bytes(CHUNK_SIZE):
+                    file.write(chunk)
+                    segments[index] += len(chunk)
+                    guard.update(len(chunk))
+                    progress.advance(len(chunk))
+
+    async def _fetch_segmented(
+        self,
+        url: str,
+        part_path: str,
+        size: int,
+        progress: _ProgressReporter,
+        guard: _ThroughputGuard,
+    ) -> tuple[str, int]:
+        """
+        Downloads url as SEGMENT_COUNT concurrent ranges into a preallocated
+        part_path. Progress of each range is kept in a sidecar file so an
+        interrupted download can be resumed, the sidecar is removed by the
+        caller once the file is verified.
+        """
+        segments_path = f"{part_path}.segments"
+        segment_size = -(-size // SEGMENT_COUNT)
+        bounds = [
+            (start, min(start + segment_size, size) - 1)
+            for start in range(0, size, segment_size)
+        ]
+
+        segments = [0] * len(bounds)
+        if path.exists(segments_path) and path.exists(part_path):
+            segments = _load_segments(segments_path, bounds)
+        else:
+            # The sidecar goes first, so a preallocated file is never
+            # mistaken for a complete one.
+            _save_segments(segments_path, segments)
+            with open(part_path, "wb") as file:
+                if hasattr(os, "posix_fallocate"):
+                    os.posix_fallocate(file.fileno(), 0, size)
+                else:
+                    file.truncate(size)
+
+        if sum(segments):
+            print(f"Resuming {part_path} from {sum(segments)} bytes")
+        progress.seek(sum(segments))
+
+        tasks = [
+            asyncio.ensure_future(
+                self._fetch_segment(
+                    url, part_path, start, end, segments, index, progress, guard
+                )
+            )
+            for index, (start, end) in enumerate(bounds)
+        ]
+        saver = asyncio.ensure_future(_keep_segments_saved(segments_path, segments))
+
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            # Stop the other ranges if one of them failed.
+            for task in [*tasks, saver]:
+                task.cancel()
+            await asyncio.gather(*tasks, saver, return_exceptions=True)
+
+            _save_segments(segments_path, segments)
+
+        # Segments arrive out of order, so the file is hashed once assembled.
+        digest = await self.loop.run_in_executor(None, _file_sha1, part_path)
+
+        return digest, sum(segments)
+
+    async def _fetch_from(
+        self,
+        url: str,
+        dest: str,
+        part_path: str,
+        sha1hash: Optional[str],
+        sha256hash: Optional[str],
+        size: Optional[int],
+        progress: _ProgressReporter,
+        is_lzma: bool,
+        guard: _ThroughputGuard,
+    ) -> int:
+        """
+        Downloads url into part_path and checks it against size and hashes.
+        Returns the number of bytes received.
+        """
+        print("Downloading file from", url, "to", dest)
+
+        segments_path = f"{part_path}.segments"
+        has_hash = bool(sha1hash or sha256hash)
+
+        # A complete partial file can only be trusted if a hash checks it,
+        # it may be a preallocated one that was never filled in.
+        if (
+            not has_hash
+            and size is not None
+            and path.exists(part_path)
+            and path.getsize(part_path) == size
+            and not path.exists(segments_path)
+        ):
+            remove(part_path)
+
+        # Large files are split into ranges unless a sequential
+        # download of them was already started. Ranges are assembled out
+        # of order, so only files with a hash to check are split.
+        is_segmented = (
+            size is not None
+            and size >= SEGMENTED_DOWNLOAD_THRESHOLD
+            and not is_lzma
+            and has_hash
+            and (not path.exists(part_path) or path.exists(segments_path))
+        )
+
+        digest, received = None, 0
+        if is_segmented and size is not None:
+            try:
+                digest, received = await self._fetch_segmented(
+                    url, part_path, size, progress, guard
+                )
+            except _RangeNotSupported:
+                print(f"{url} doesn't support ranges, downloading sequentially")
+                remove(part_path)
+                remove(segments_path)
+
+        if digest is None:
+            digest, received = await self._fetch(
+                url, part_path, size, progress, is_lzma, guard
+            )
+
+        if size is not None and received != size:
+            _discard_part(part_path)
+            raise _IntegrityError(f"Size mismatch for {dest}")
+
+        if sha1hash and digest != sha1hash:
+            _discard_part(part_path)
+            raise _IntegrityError(f"Hash mismatch for {dest}")
+
+        if sha256hash:
+            sha256 = await self.loop.run_in_executor(None, _file_sha256, part_path)
+            if sha256 != sha256hash:
+                _discard_part(part_path)
+                raise _IntegrityError(f"Hash mismatch for {dest}")
+
+        if path.exists(segments_path):
+            remove(segments_path)
+
+        return received
+
+    async def _fetch_with_retries(
+        self,
+        url: str,
+        dest: str,
+        part_path: str,
+        sha1hash: Optional[str],
+        sha256hash: Optional[str],
+        size: Optional[int],
+        progress: _ProgressReporter,
+        is_lzma: bool,
+        can_failover: bool,
+    ) -> int:
+        """
+        Applies the policy of the host of url: a cap on concurrent requests,
+        retries with backoff on transient errors and the circuit breaker
+        """
+        host = httpx.URL(url).host
+        if host not in self.policies:
+            self.policies[host] = HostPolicy(host)
+        policy = self.policies[host]
+
+        attempt = 0
+        while True:
+            policy.check()
+            guard = _ThroughputGuard(can_failover)
+
+            try:
+                async with policy.semaphore:
+                    received = await self._fetch_from(
+                        url,
+                        dest,
+                        part_path,
+                        sha1hash,
+                        sha256hash,
+                        size,
+                        progress,
+                        is_lzma,
+                        guard,
+                    )
+            except (httpx.HTTPError, _IntegrityError) as e:
+                if not is_transient(e) and not isinstance(e, _IntegrityError):
+                    raise
+
+                policy.record_failure()
+                if attempt == MAX_RETRIES:
+                    raise
+
+                delay = get_retry_delay(attempt)
+                print(f"{url} failed ({e}), retrying in {delay:.1f}s")
+                await asyncio.sleep(delay)
+                attempt += 1
+            else:
+                policy.record_success()
+                return received
+
+    async def download(
+        self,
+        url: str,
+        dest: str,
+        sha1hash: Optional[str],
+        sha256hash: Optional[str],
+        size: Optional[int],
+        callbacks: Optional[ProgressCallbacks],
+        is_lzma: bool,
+        set_executable: bool,
+    ) -> int:
+        # If the file already exists, we check if the hash matches.
+        if path.exists(dest):
+            print(f"File {dest} already exists, checking hash...")
+
+            is_verified = False
+            if sha1hash:
+                # Files that were hashed before and haven't been touched since
+                # are accepted straight from their metadata.
+                is_verified = verification_index.is_verified(dest, sha1hash)
+                if not is_verified:
+                    digest = await self.loop.run_in_executor(None, _file_sha1, dest)
+                    is_verified = digest == sha1hash
+                    if is_verified:
+                        verification_index.record(dest, sha1hash)
+            elif sha256hash:
+                digest = await self.loop.run_in_executor(None, _file_sha256, dest)
+                is_verified = digest == sha256hash
+
+            if is_verified:
+                if callbacks:
+                    file_size = path.getsize(dest)
+                    callbacks.increment_value_by(file_size)
+
+                print(f"{dest} Hash matches, skipping download.")
+                return 0
+
+            print(f"{dest} Hash does not match, redownloading.")
+            verification_index.forget(dest)
+            remove(dest)
+
+        # Partial downloads are kept next to the destination and resumed.
+        part_path = f"{dest}.part"
+        makedirs(path.dirname(dest), exist_ok=True)
+        progress = _ProgressReporter(callbacks)
+
+        urls = mirrors.get_urls(url)
+        for index, candidate in enumerate(urls):
+            can_failover = index < len(urls) - 1
+
+            try:
+                received = await self._fetch_with_retries(
+                    candidate,
+                    dest,
+                    part_path,
+                    sha1hash,
+                    sha256hash,
+                    size,
+                    progress,
+                    is_lzma,
+                    can_failover,
+                )
+                break
+            except (
+                httpx.HTTPError,
+                _SlowMirror,
+                _IntegrityError,
+                CircuitOpenError,
+            ) as e:
+                if not can_failover:
+                    raise
+
+                print(f"{candidate} failed ({e}), trying the next mirror")
+
+        os.replace(part_path, dest)
+
+        if sha1hash:
+            verification_index.record(dest, sha1hash)
+
+        print(f"Downloaded {dest}")
+
+        if set_executable:
+            st = os.stat(dest)
+            chmod(dest, st.st_mode | stat.S_IEXEC)
+
+        return received
+
+
+_engine: Optional[_DownloadEngine] = None
+_engine_lock = Lock()
+
+
+def _get_engine() -> _DownloadEngine:
+    global _engine
+
+    with _engine_lock:
+        if _engine is None:
+            _engine = _DownloadEngine()
+
+    return _engine
+
+
+def submit_downloads(
+    downloads: list[Download], callbacks: Optional[ProgressCallbacks] = None
+) -> list["Future[int]"]:
+    """
+    Schedules downloads on the shared engine and returns immediately.
+    Each future resolves to the number of bytes that had to be downloaded.
+    """
+    return _get_engine().submit(downloads, callbacks)
+
+
+def download_file(
+    url: str,
+    dest: str,
+    sha1hash: Optional[str] = None,
+    callbacks: Optional[ProgressCallbacks] = None,
+    is_lzma: bool = False,
+    set_executable: bool = False,
+    size: Optional[int] = None,
+    sha256hash: Optional[str] = None,
+) -> None:
+    download = Download(
+        url=url,
+        dest=dest,
+        sha1hash=sha1hash,
+        sha256hash=sha256hash,
+        size=size,
+        is_lzma=is_lzma,
+        set_executable=set_executable,
+    )
+    submit_downloads([download], callbacks)[0].result()
+
+
+def get_concurrency() -> tuple[int, int]:
+    """
+    Returns the current and the highest number of parallel downloads picked
+    by the concurrency controller
+    """
+    controller = _get_engine().controller
+
+    return controller.limit, controller.peak_limit
+
+
+def reset_peak_concurrency() -> None:
+    """
+    Starts tracking the highest number of parallel downloads from the
+    current one, so get_concurrency reports the peak of a single install
+    """
+    _get_engine().controller.reset_peak()
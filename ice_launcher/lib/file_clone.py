@@ -0,0 +1,38 @@
+# SPDX-FileCopyrightText: 2022-present Manuel Quarneti <manuelquarneti@gmail.com>
+#
+# SPDX-License-Identifier: GPL-3.0-only
+
+import os
+import shutil
+from os import path
+from typing import Final
+
+FICLONE: Final[int] = 0x40049409  # linux/fs.h
+
+
+def clone_file(source: str, dest: str) -> None:
+    """
+    Hardlinks source to dest, falling back to a reflink and then to a copy
+    """
+    try:
+        os.link(source, dest)
+        return
+    except FileExistsError:
+        if path.samefile(source, dest):
+            return
+        os.remove(dest)
+        return clone_file(source, dest)
+    except OSError:
+        # Different filesystem, or one without hardlinks.
+        pass
+
+    try:
+        import fcntl
+
+        with open(source, "rb") as src, open(dest, "wb") as dst:
+            fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+        return
+    except (ImportError, OSError):
+        pass
+
+    shutil.copyfile(source, dest)
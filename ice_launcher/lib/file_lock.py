@@ -0,0 +1,90 @@
+# SPDX-FileCopyrightText: 2022-present Manuel Quarneti <manuelquarneti@gmail.com>
+#
+# SPDX-License-Identifier: GPL-3.0-only
+
+import asyncio
+import os
+import zlib
+from os import makedirs, path
+from threading import Lock
+from typing import Final, Optional
+
+from . import LOCKS_DIR
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    import msvcrt
+
+LOCK_STRIPES: Final[int] = 1024
+LOCK_POLL_INTERVAL: Final[float] = 0.1  # seconds
+
+# Lock files held by this process: path -> (fd, number of holders).
+_held: dict[str, tuple[int, int]] = {}
+_held_lock = Lock()
+
+
+class FileLock:
+    """
+    Advisory lock shared by every launcher process using the same data dir.
+
+    Names are spread over LOCK_STRIPES lock files that are never deleted, so
+    there is no race between removing a lock file and someone opening it.
+
+    Only other processes are kept out: locks of this process whose names
+    share a stripe share the lock file too, instead of waiting on each
+    other. Callers exclude each other within a process on their own.
+    """
+
+    def __init__(self, name: str) -> None:
+        stripe = zlib.crc32(name.encode()) % LOCK_STRIPES
+        self.path = path.join(LOCKS_DIR, f"{stripe:03x}.lock")
+        self.fd: Optional[int] = None
+
+    def try_acquire(self) -> bool:
+        if self.fd is not None:
+            return True
+
+        with _held_lock:
+            if self.path in _held:
+                fd, holders = _held[self.path]
+                _held[self.path] = (fd, holders + 1)
+                self.fd = fd
+                return True
+
+            makedirs(LOCKS_DIR, exist_ok=True)
+            fd = os.open(self.path, os.O_RDWR | os.O_CREAT)
+
+            try:
+                if os.name == "nt":
+                    msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
+                else:
+                    fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                os.close(fd)
+                return False
+
+            _held[self.path] = (fd, 1)
+            self.fd = fd
+            return True
+
+    async def acquire(self) -> None:
+        while not self.try_acquire():
+            await asyncio.sleep(LOCK_POLL_INTERVAL)
+
+    def release(self) -> None:
+        if self.fd is None:
+            return
+
+        with _held_lock:
+            fd, holders = _held.pop(self.path)
+            self.fd = None
+            if holders > 1:
+                _held[self.path] = (fd, holders - 1)
+                return
+
+            if os.name == "nt":
+                msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+
+            # Closing the file drops the lock.
+            os.close(fd)
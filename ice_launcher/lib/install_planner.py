@@ -0,0 +1,138 @@
+# SPDX-FileCopyrightText: 2022-present Manuel Quarneti <manuelquarneti@gmail.com>
+#
+# SPDX-License-Identifier: GPL-3.0-only
+
+import hashlib
+import json
+import mmap
+import os
+from concurrent.futures import ThreadPoolExecutor
+from enum import Enum
+from os import path
+from typing import Optional
+
+from pydantic import BaseModel
+
+from . import Download, store_layers, verification_index
+
+
+class IntegrityLevel(str, Enum):
+    quick = "quick"  # size only
+    standard = "standard"  # size, then the verification index or a full hash
+    full = "full"  # full hash of every file
+
+
+class InstallPlan(BaseModel):
+    downloads: list[Download]  # files that have to be fetched
+    files: int
+    present_files: int
+    present_bytes: int
+    shared_files: int  # present in a shared store
+    fetch_bytes: int  # total size of the files to fetch
+    resumable_bytes: int  # already in partial downloads
+    transfer_bytes: int  # what is left to download
+
+
+def _mmap_sha1(file_path: str) -> str:
+    with open(file_path, "rb") as f:
+        if path.getsize(file_path) == 0:
+            return hashlib.sha1().hexdigest()
+
+        # hashlib releases the GIL on large buffers, so threads hash in parallel.
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            return hashlib.sha1(mm).hexdigest()
+
+
+def is_file_valid(download: Download, level: IntegrityLevel) -> bool:
+    try:
+        size = path.getsize(download.dest)
+    except FileNotFoundError:
+        return False
+
+    if download.size is not None and size != download.size:
+        return False
+    if level == IntegrityLevel.quick or not download.sha1hash:
+        return True
+    if level == IntegrityLevel.standard and verification_index.is_verified(
+        download.dest, download.sha1hash
+    ):
+        return True
+
+    if _mmap_sha1(download.dest) != download.sha1hash:
+        return False
+
+    verification_index.record(download.dest, download.sha1hash)
+    return True
+
+
+def _find_valid_layer(download: Download, level: IntegrityLevel) -> Optional[str]:
+    """
+    Returns the path of the first valid copy of download, looking in the
+    shared stores first and in the local one last
+    """
+    for candidate in store_layers.get_candidates(download.dest):
+        layer_download = download
+        if candidate != download.dest:
+            if not path.exists(candidate):
+                continue
+            layer_download = download.copy(update={"dest": candidate})
+
+        if is_file_valid(layer_download, level):
+            return candidate
+
+    return None
+
+
+def _get_partial_size(download: Download) -> int:
+    """
+    Returns how much of the file the downloader will be able to resume
+    """
+    part_path = f"{download.dest}.part"
+    segments_path = f"{part_path}.segments"
+
+    if not path.exists(part_path) or download.is_lzma:
+        return 0
+    if path.exists(segments_path):
+        with open(segments_path) as f:
+            return sum(json.load(f))
+
+    partial_size = path.getsize(part_path)
+    if download.size is not None and partial_size > download.size:
+        return 0
+
+    return partial_size
+
+
+def plan_downloads(
+    downloads: list[Download], level: IntegrityLevel = IntegrityLevel.standard
+) -> InstallPlan:
+    """
+    Compares downloads against what is already on disk, in the local store
+    or in a shared one, without changing it
+    """
+    with ThreadPoolExecutor(max_workers=os.cpu_count()) as executor:
+        results = list(
+            executor.map(lambda download: _find_valid_layer(download, level), downloads)
+        )
+
+    missing = [download for download, found in zip(downloads, results) if not found]
+    present = [download for download, found in zip(downloads, results) if found]
+    shared = [
+        found
+        for download, found in zip(downloads, results)
+        if found and found != download.dest
+    ]
+
+    fetch_bytes = sum(download.size or 0 for download in missing)
+    resumable_bytes = sum(_get_partial_size(download) for download in missing)
+
+    return InstallPlan(
+        downloads=missing,
+        files=len(downloads),
+        present_files=len(present),
+        present_bytes=sum(download.size or 0 for download in present),
+        shared_files=len(shared),
+        fetch_bytes=fetch_bytes,
+        resumable_bytes=resumable_bytes,
+        transfer_bytes=fetch_bytes - resumable_bytes,
+    )
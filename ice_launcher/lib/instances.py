@@ -4,8 +4,9 @@
 
 import platform
 import subprocess
+import time
 from enum import Enum
-from os import listdir, makedirs, path
+from os import listdir, makedirs, path, pathsep
 from os import rename as mv
 from shutil import rmtree
 from subprocess import Popen
@@ -17,13 +18,16 @@ import tomli_w
 from pydantic import BaseModel
 
 from . import (
-    ASSETS_DIR,
     INSTANCES_DIR,
     ProgressCallbacks,
     __version__,
     accounts,
+    class_data_sharing,
     jre_manager,
+    launch_plan,
+    minecraft_assets,
     minecraft_version_meta,
+    natives,
 )
 from .minecraft_rules import is_rule_list_valid
 from .minecraft_version_meta import get_classpath_string
@@ -133,31 +137,30 @@ def delete(instance_name: str) -> None:
     rmtree(instance_dir)
 
 
-def launch(instance_name: str, account_id: str, callback_function: Callable) -> None:
-    print(f"Launching instance {instance_name}")
-
-    print("Refreshing account")
-    account = accounts.refresh_account(account_id)
-    print("Account successfully refreshed")
-
-    instance_info = read_info(instance_name)
+def _compile_launch_plan(
+    instance_name: str,
+    instance_info: InstanceInfo,
+    java_path: str,
+    key: launch_plan.LaunchPlanKey,
+) -> launch_plan.LaunchPlan:
+    """
+    Builds the launch command, leaving the auth fields as placeholders
+    """
     version_meta = minecraft_version_meta.get_version_meta(
         instance_info.minecraft_version
     )
 
-    jre_version = instance_info.jre_version
-    if jre_version == "latest":
-        jre_version = jre_manager.fetch_latest_java_version()
+    game_dir = path.join(INSTANCES_DIR, instance_name)
+    layout_dir = minecraft_assets.materialize_assets(version_meta.assetIndex, game_dir)
+    assets_root = minecraft_assets.get_assets_root(version_meta.assetIndex)
 
-    is_updated = jre_manager.is_updated(jre_version)
-    if not is_updated:
-        print("Updating JRE")
-        jre_manager.update(jre_version)
-
-    java_path = jre_manager.get_java_path(jre_version)
+    if version_meta.arguments:
+        arguments = version_meta.arguments.game
+    else:
+        arguments = (version_meta.minecraftArguments or "").split()
 
     game_arguments = []
-    for argument in version_meta.arguments.game:
+    for argument in arguments:
         if isinstance(argument, minecraft_version_meta._ComplexArgument):
             if is_rule_list_valid(argument.rules):
                 argument = argument.value
@@ -166,20 +169,18 @@ def launch(instance_name: str, account_id: str, callback_function: Callable) ->
 
         if argument:
             match argument:
-                case "${auth_player_name}":
-                    argument = account.minecraft_username
                 case "${version_name}":
                     argument = instance_info.minecraft_version
                 case "${game_directory}":
-                    argument = path.join(INSTANCES_DIR, instance_name)
+                    argument = game_dir
                 case "${assets_root}":
-                    argument = ASSETS_DIR
+                    argument = assets_root
+                case "${game_assets}":
+                    argument = layout_dir or assets_root
                 case "${assets_index_name}":
                     argument = version_meta.assetIndex.id
-                case "${auth_uuid}":
-                    argument = account_id
-                case "${auth_access_token}":
-                    argument = account.minecraft_access_token
+                case "${user_properties}":
+                    argument = "{}"
                 case "${clientid}":
                     argument = f"ice-launcher/{__version__}"
                 case "${auth_xuid}":
@@ -204,13 +205,17 @@ def launch(instance_name: str, account_id: str, callback_function: Callable) ->
     if platform.machine() in ["x86", "i386", "i686"]:
         jvm_arguments.append("-Xss1M")
 
-    jvm_arguments.append("-Djava.library.path=natives")
+    natives_dir = natives.prepare_natives(version_meta.libraries)
+    classpath = get_classpath_string(
+        version_meta.libraries,
+        instance_info.minecraft_version,
+        version_meta.downloads.client,
+    )
+    jvm_arguments.append(f"-Djava.library.path={natives_dir}")
     jvm_arguments.append("-Dminecraft.launcher.brand=ice-launcher")
     jvm_arguments.append(f"-Dminecraft.launcher.version={__version__}")
     jvm_arguments.append("-cp")
-    jvm_arguments.append(
-        get_classpath_string(version_meta.libraries, instance_info.minecraft_version)
-    )
+    jvm_arguments.append(classpath)
 
     command = [
         java_path,
@@ -220,10 +225,74 @@ def launch(instance_name: str, account_id: str, callback_function: Callable) ->
         *game_arguments,
     ]
 
+    required_paths = [java_path, natives_dir, assets_root, *classpath.split(pathsep)]
+    if layout_dir:
+        required_paths.append(layout_dir)
+
+    return launch_plan.LaunchPlan(
+        key=key, command=command, classpath=classpath, required_paths=required_paths
+    )
+
+
+def launch(instance_name: str, account_id: str, callback_function: Callable) -> None:
+    print(f"Launching instance {instance_name}")
+
+    print("Refreshing account")
+    account = accounts.refresh_account(account_id)
+    print("Account successfully refreshed")
+
+    instance_info = read_info(instance_name)
+
+    jre_version = instance_info.jre_version
+    if jre_version == "latest":
+        jre_version = jre_manager.fetch_latest_java_version()
+
+    is_updated = jre_manager.is_updated(jre_version)
+    if not is_updated:
+        print("Updating JRE")
+        jre_manager.update(jre_version)
+
+    java_path = jre_manager.get_java_path(jre_version)
+
+    # The command only changes with the version, platform, JRE and stores,
+    # so it is compiled once and reused until one of them does.
+    key = launch_plan.get_key(instance_name, instance_info.minecraft_version, java_path)
+    plan = launch_plan.load(instance_name, key)
+    if plan is None:
+        print("Compiling launch plan")
+        plan = _compile_launch_plan(instance_name, instance_info, java_path, key)
+        launch_plan.save(instance_name, plan)
+
+    command = plan.get_command(
+        {
+            "${auth_player_name}": account.minecraft_username,
+            "${auth_uuid}": account_id,
+            "${auth_access_token}": account.minecraft_access_token,
+            "${auth_session}": f"token:{account.minecraft_access_token}:{account_id}",
+        }
+    )
+
+    # Classes loaded by the first run are archived at exit and mapped by the
+    # next ones, which skips most of the class loading at startup.
+    archive_path = class_data_sharing.get_archive_path(
+        instance_name, java_path, plan.classpath
+    )
+    is_warm = archive_path is not None and path.isfile(archive_path)
+    if archive_path is not None:
+        command[1:1] = class_data_sharing.get_jvm_arguments(archive_path)
+
+    def on_started(duration: float) -> None:
+        if archive_path is not None:
+            class_data_sharing.record_startup(archive_path, is_warm, duration)
+
     def start():
+        started_at = time.monotonic()
         process = Popen(
             command, cwd=path.join(INSTANCES_DIR, instance_name), stdout=subprocess.PIPE
         )
+        process.stdout = class_data_sharing.StartupTimer(  # type: ignore
+            process.stdout, started_at, on_started  # type: ignore
+        )
         callback_function(process)
 
     Thread(target=start).start()
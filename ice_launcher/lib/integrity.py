@@ -0,0 +1,97 @@
+# SPDX-FileCopyrightText: 2022-present Manuel Quarneti <manuelquarneti@gmail.com>
+#
+# SPDX-License-Identifier: GPL-3.0-only
+
+import subprocess
+from os import path, remove
+from typing import Optional
+
+from pydantic import BaseModel
+
+from . import Download, ProgressCallbacks, jre_manager, verification_index
+from .install_planner import IntegrityLevel, plan_downloads
+from .minecraft_version_meta import get_version_meta
+from .minecraft_versions import download_all, get_version_downloads
+
+
+class VerificationReport(BaseModel):
+    version_id: str
+    level: IntegrityLevel
+    checked: int
+    failed: list[Download]
+    # Below the full level this only means the java binary exists.
+    is_jre_valid: bool
+
+
+def _get_java_path() -> Optional[str]:
+    jres = [
+        jre for jre in jre_manager.list_jres() if path.basename(jre).startswith("jdk-")
+    ]
+
+    # The newest JRE is checked, wherever it is stored.
+    for jre in sorted(jres, key=jre_manager.get_semver, reverse=True):
+        java_path = jre_manager.get_jre_java_path(jre)
+        if path.isfile(java_path):
+            return java_path
+
+    return None
+
+
+def _is_jre_valid(level: IntegrityLevel) -> bool:
+    java_path = _get_java_path()
+    if java_path is None:
+        return False
+    if level != IntegrityLevel.full:
+        return True
+
+    # The JRE files themselves are not walked: Adoptium only publishes a
+    # checksum of the archive, so the full check makes sure the JRE
+    # actually starts instead.
+    result = subprocess.run([java_path, "-version"], capture_output=True)
+
+    return result.returncode == 0
+
+
+def verify_version(
+    version_id: str, level: IntegrityLevel = IntegrityLevel.standard
+) -> VerificationReport:
+    """
+    Checks the assets, libraries, client and JRE of an installed version
+    """
+    version_meta = get_version_meta(version_id)
+    plan = plan_downloads(get_version_downloads(version_id, version_meta), level)
+
+    return VerificationReport(
+        version_id=version_id,
+        level=level,
+        checked=plan.files,
+        failed=plan.downloads,
+        is_jre_valid=_is_jre_valid(level),
+    )
+
+
+def repair_version(
+    version_id: str,
+    level: IntegrityLevel = IntegrityLevel.standard,
+    callbacks: Optional[ProgressCallbacks] = None,
+) -> VerificationReport:
+    """
+    Verifies a version and downloads again only the files that failed
+    """
+    report = verify_version(version_id, level)
+
+    for download in report.failed:
+        if path.exists(download.dest):
+            verification_index.forget(download.dest)
+            remove(download.dest)
+
+    if report.failed:
+        if callbacks:
+            callbacks.set_status(f"Repairing {len(report.failed)} files")
+            callbacks.set_max(sum(download.size or 0 for download in report.failed))
+        download_all(report.failed, callbacks)
+
+    if not report.is_jre_valid:
+        jre_manager.update(jre_manager.fetch_latest_java_version())
+
+    return report
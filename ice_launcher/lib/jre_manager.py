@@ -2,18 +2,20 @@
 #
 # SPDX-License-Identifier: GPL-3.0-only
 
+import json
 import platform
 from os import listdir, makedirs, path, remove
 from shutil import rmtree, unpack_archive
 from typing import Final
 
-import httpx
 from packaging import version
 from pydantic import BaseModel, HttpUrl
 
-from . import JRES_DIR, download_file, headers
+from . import JRES_DIR, download_file, metadata_cache, store_layers
 
 ADOPTIUM_API_ENDPOINT: Final[str] = "https://api.adoptium.net"
+AVAILABLE_RELEASES_TTL: Final[int] = 86400  # 1 day
+ASSETS_INFO_TTL: Final[int] = 21600  # 6 hours
 
 
 class _Package(BaseModel):
@@ -38,8 +40,10 @@ class _Assets(BaseModel):
 
 def fetch_latest_java_version() -> str:
     path = "/v3/info/available_releases"
-    response = httpx.get(f"{ADOPTIUM_API_ENDPOINT}{path}", headers=headers)
-    latest_release = response.json()["most_recent_feature_release"]
+    content = metadata_cache.get(
+        f"{ADOPTIUM_API_ENDPOINT}{path}", ttl=AVAILABLE_RELEASES_TTL
+    )
+    latest_release = json.loads(content)["most_recent_feature_release"]
 
     return latest_release
 
@@ -75,33 +79,55 @@ def _get_assets_info(java_version: str) -> _Assets:
         "vendor": "eclipse",
     }
 
-    response = httpx.get(
+    content = metadata_cache.get(
         f"{ADOPTIUM_API_ENDPOINT}{url_path}",
-        headers=headers | {"Accept": "application/json"},
+        ttl=ASSETS_INFO_TTL,
         params=params,
+        headers={"Accept": "application/json"},
     )
-    assets_info_list = response.json()
+    assets_info_list = json.loads(content)
 
     return _Assets.parse_obj(assets_info_list[0])
 
 
-def is_updated(java_version: str) -> bool:
+def list_jres() -> list[str]:
+    """
+    Returns the installed JRE dirs of every store layer, shared ones first
+    """
     makedirs(JRES_DIR, exist_ok=True)
 
-    assets_info = _get_assets_info(java_version)
+    jres = []
+    for jres_dir in store_layers.get_candidates(JRES_DIR):
+        if path.isdir(jres_dir):
+            for dir in listdir(jres_dir):
+                if path.isdir(path.join(jres_dir, dir)):
+                    jres.append(path.join(jres_dir, dir))
 
-    current_semver = [
-        dir for dir in listdir(JRES_DIR) if path.isdir(path.join(JRES_DIR, dir))
-    ]
-    if len(current_semver) == 0:
-        return False
+    return jres
 
-    current_semver = version.parse(
-        current_semver[0].replace("jdk-", "").replace("-jre", "")
-    )
+
+def get_semver(jre: str) -> version.Version:
+    """
+    Parses the version of a JRE dir, like jdk-17.0.5+8-jre
+    """
+    name = path.basename(jre)
+
+    return version.parse(name.replace("jdk-", "").replace("-jre", ""))
+
+
+def is_updated(java_version: str) -> bool:
+    assets_info = _get_assets_info(java_version)
     latest_semver = version.parse(assets_info.version.semver)
 
-    return current_semver >= latest_semver
+    for jre in list_jres():
+        name = path.basename(jre)
+        if not name.startswith(f"jdk-{java_version}"):
+            continue
+
+        if get_semver(jre) >= latest_semver:
+            return True
+
+    return False
 
 
 def update(java_version: str) -> None:
@@ -119,6 +145,8 @@ def update(java_version: str) -> None:
     download_file(
         url=download_url,
         dest=download_path,
+        size=assets_info.binary.package.size,
+        sha256hash=assets_info.binary.package.checksum,
     )
 
     unpack_archive(download_path, JRES_DIR)
@@ -134,20 +162,25 @@ def update(java_version: str) -> None:
             remove(file_path)
 
 
-def get_java_path(version: str) -> str:
-    makedirs(JRES_DIR, exist_ok=True)
-
-    available_jres = [
-        dir for dir in listdir(JRES_DIR) if path.isdir(path.join(JRES_DIR, dir))
-    ]
-
-    current_jre = [dir for dir in available_jres if dir.startswith(f"jdk-{version}")][0]
-
+def get_jre_java_path(jre: str) -> str:
     if platform.system() == "Windows":
-        return path.join(JRES_DIR, current_jre, "bin", "java.exe")
+        return path.join(jre, "bin", "java.exe")
     if platform.system() == "Darwin":
-        return path.join(JRES_DIR, current_jre, "Contents", "Home", "bin", "java")
+        return path.join(jre, "Contents", "Home", "bin", "java")
     if platform.system() == "Linux":
-        return path.join(JRES_DIR, current_jre, "bin", "java")
+        return path.join(jre, "bin", "java")
 
     raise Exception("JRE not found")
+
+
+def get_java_path(version: str) -> str:
+    jres = [
+        jre for jre in list_jres() if path.basename(jre).startswith(f"jdk-{version}")
+    ]
+    if not jres:
+        raise Exception("JRE not found")
+
+    # Shared stores come first, but an outdated JRE there must not win.
+    current_jre = max(jres, key=get_semver)
+
+    return get_jre_java_path(current_jre)
@@ -0,0 +1,169 @@
+# SPDX-FileCopyrightText: 2022-present Manuel Quarneti <manuelquarneti@gmail.com>
+#
+# SPDX-License-Identifier: GPL-3.0-only
+
+import os
+import re
+import socket
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from os import path
+from typing import Any, Final, Optional
+
+from . import (
+    ASSETS_DIR,
+    LIBRARIES_DIR,
+    __version__,
+    metadata_cache,
+    store_layers,
+    verification_index,
+)
+
+DEFAULT_PORT: Final[int] = 25580
+# Dozens of clients with up to 16 connections each may connect at once.
+LISTEN_BACKLOG: Final[int] = 1024
+VERSIONS_UPSTREAM: Final[str] = "https://piston-meta.mojang.com"
+
+# Version files are content addressed upstream, e.g. /v1/objects/<sha1>/client.jar
+_VERSIONS_OBJECT_PATTERN: Final[re.Pattern] = re.compile(
+    r"/v1/(?:objects|packages)/([0-9a-f]{40})/[^/]+"
+)
+_RANGE_PATTERN: Final[re.Pattern] = re.compile(r"bytes=(\d*)-(\d*)")
+_WILDCARD_HOSTS: Final[tuple[str, ...]] = ("", "0.0.0.0", "::")
+
+
+def _join(root: str, url_path: str) -> Optional[str]:
+    """
+    Maps url_path below root, refusing anything that escapes it
+    """
+    file_path = path.normpath(path.join(root, url_path.lstrip("/")))
+    if path.commonpath([root, file_path]) != root:
+        return None
+
+    return file_path
+
+
+def get_file_path(url_path: str) -> Optional[str]:
+    """
+    Maps a mirror URL path to a file of the store, laid out like the
+    mirrors config expects: /assets, /libraries and /versions
+    """
+    artifact_class, _, rest = url_path.lstrip("/").partition("/")
+    rest = "/" + rest
+
+    file_path = None
+    if artifact_class == "assets":
+        file_path = _join(path.join(ASSETS_DIR, "objects"), rest)
+    elif artifact_class == "libraries":
+        file_path = _join(LIBRARIES_DIR, rest)
+    elif artifact_class == "versions":
+        if match := _VERSIONS_OBJECT_PATTERN.fullmatch(rest):
+            return verification_index.find(match[1])
+        if rest.startswith("/mc/game/"):
+            # The manifest is only kept in the metadata cache.
+            return metadata_cache.get_cached_path(f"{VERSIONS_UPSTREAM}{rest}")
+
+    if file_path is None:
+        return None
+
+    return store_layers.resolve(file_path)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server_version = f"ice-launcher/{__version__}"
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+    def do_HEAD(self) -> None:
+        self._serve(send_body=False)
+
+    def do_GET(self) -> None:
+        self._serve(send_body=True)
+
+    def _serve(self, send_body: bool) -> None:
+        file_path = get_file_path(self.path.split("?")[0])
+        if file_path is None or not path.isfile(file_path):
+            self.send_error(404)
+            return
+
+        with open(file_path, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            start, end = 0, size - 1
+
+            match = _RANGE_PATTERN.fullmatch(self.headers.get("Range", ""))
+            if match and (match[1] or match[2]):
+                if match[1]:
+                    start = int(match[1])
+                    end = min(int(match[2]), size - 1) if match[2] else end
+                else:
+                    # A suffix range, the last n bytes.
+                    start = max(0, size - int(match[2]))
+
+                if start >= size or start > end:
+                    self.send_response(416)
+                    self.send_header("Content-Range", f"bytes */{size}")
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+
+                self.send_response(206)
+                self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+            else:
+                self.send_response(200)
+
+            self.send_header("Content-Length", str(end - start + 1))
+            self.send_header("Content-Type", "application/octet-stream")
+            self.send_header("Accept-Ranges", "bytes")
+            self.end_headers()
+
+            if send_body and end >= start:
+                self.wfile.flush()
+
+                # Straight from the page cache to the socket.
+                self.connection.sendfile(f, start, end - start + 1)
+
+
+def _get_lan_address() -> str:
+    """
+    Returns the address other machines on the network most likely reach this
+    one at, or its hostname if there is no route
+    """
+    # Connecting a UDP socket sends nothing, it only picks the outgoing interface.
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as probe:
+        try:
+            probe.connect(("10.255.255.255", 1))
+            return probe.getsockname()[0]
+        except OSError:
+            return socket.gethostname()
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = LISTEN_BACKLOG
+
+
+def serve(host: str = "0.0.0.0", port: int = DEFAULT_PORT) -> None:
+    """
+    Serves the local store over HTTP until interrupted, so that other
+    launchers can use this machine as a mirror
+    """
+    server = _Server((host, port), _Handler)
+
+    base = f"http://{host}:{port}"
+    if host in _WILDCARD_HOSTS:
+        # The wildcard address can't be connected to from other machines.
+        base = f"http://{_get_lan_address()}:{port}"
+        print(f"Listening on every interface, replace {base} with another")
+        print("address of this machine if clients can't reach it")
+
+    print(f"Serving the store on {base}, point the mirrors config at it:")
+    print(f'[mirrors]\nassets = ["{base}/assets"]')
+    print(f'libraries = ["{base}/libraries"]\nversions = ["{base}/versions"]')
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
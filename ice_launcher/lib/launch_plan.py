@@ -0,0 +1,90 @@
+# SPDX-FileCopyrightText: 2022-present Manuel Quarneti <manuelquarneti@gmail.com>
+#
+# SPDX-License-Identifier: GPL-3.0-only
+
+import hashlib
+from os import path
+from typing import Final, Optional
+
+from pydantic import BaseModel
+
+from . import INSTANCES_DIR, __version__, store_layers, write_atomic
+from .minecraft_rules import PlatformContext, get_platform_context
+from .minecraft_version_meta import get_version_meta_path
+
+LAUNCH_PLAN_FILE: Final[str] = "launch_plan.json"
+
+
+class LaunchPlanKey(BaseModel):
+    launcher_version: str
+    minecraft_version: str
+    version_meta_sha1: str
+    platform: PlatformContext
+    java_path: str
+    game_dir: str
+    store_layers: list[str]
+
+
+class LaunchPlan(BaseModel):
+    key: LaunchPlanKey
+    command: list[str]
+    classpath: str
+    # Files and dirs the command points to, checked before reusing it.
+    required_paths: list[str]
+
+    def get_command(self, auth: dict[str, str]) -> list[str]:
+        """
+        Fills in the auth placeholders, like ${auth_access_token}
+        """
+        return [auth.get(argument, argument) for argument in self.command]
+
+
+def _get_plan_path(instance_name: str) -> str:
+    return path.join(INSTANCES_DIR, instance_name, LAUNCH_PLAN_FILE)
+
+
+def get_key(
+    instance_name: str, minecraft_version: str, java_path: str
+) -> LaunchPlanKey:
+    """
+    Everything a compiled launch plan depends on
+    """
+    with open(get_version_meta_path(minecraft_version), "rb") as f:
+        version_meta_sha1 = hashlib.sha1(f.read()).hexdigest()
+
+    return LaunchPlanKey(
+        launcher_version=__version__,
+        minecraft_version=minecraft_version,
+        version_meta_sha1=version_meta_sha1,
+        platform=get_platform_context(),
+        java_path=java_path,
+        game_dir=path.join(INSTANCES_DIR, instance_name),
+        store_layers=store_layers.get_layers(),
+    )
+
+
+def load(instance_name: str, key: LaunchPlanKey) -> Optional[LaunchPlan]:
+    """
+    Returns the saved launch plan, if it was compiled for key and the files
+    it uses are still there
+    """
+    plan_path = _get_plan_path(instance_name)
+    if not path.exists(plan_path):
+        return None
+
+    try:
+        plan = LaunchPlan.parse_file(plan_path)
+    except Exception as e:
+        print(f"Ignoring broken launch plan {plan_path}: {e}")
+        return None
+
+    if plan.key != key:
+        return None
+    if not all(path.exists(required_path) for required_path in plan.required_paths):
+        return None
+
+    return plan
+
+
+def save(instance_name: str, plan: LaunchPlan) -> None:
+    write_atomic(_get_plan_path(instance_name), plan.json().encode())
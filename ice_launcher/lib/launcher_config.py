@@ -11,11 +11,25 @@ from pydantic import BaseModel
 from . import CONFIG_PATH
 
 
+class Mirrors(BaseModel):
+    """
+    Base URLs tried in order before the upstream endpoint of each artifact class
+    """
+
+    assets: list[str] = []
+    libraries: list[str] = []
+    versions: list[str] = []
+    java: list[str] = []
+
+
 class Config(BaseModel):
     config_version: int = 1
     automatically_check_for_updates: bool = True
     jvm_arguments: list[str] = []
     jvm_memory: str = "2G"
+    mirrors: Mirrors = Mirrors()
+    # Data dirs of other installs, searched before this one and never written
+    shared_stores: list[str] = []
 
 
 def write(config: Config) -> None:
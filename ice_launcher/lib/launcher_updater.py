@@ -4,15 +4,15 @@
 
 from typing import Final, Optional
 
-import httpx
 import packaging.version
 from pydantic import BaseModel
 
-from . import __version__, headers
+from . import __version__, metadata_cache
 
 LATEST_RELEASE_URL: Final[
     str
 ] = "https://api.github.com/repos/mq1/ice-launcher/releases/latest"
+LATEST_RELEASE_TTL: Final[int] = 21600  # 6 hours
 
 
 class _ReleaseInfo(BaseModel):
@@ -22,8 +22,8 @@ class _ReleaseInfo(BaseModel):
 def _get_latest_release() -> str:
     """Get the latest release of the launcher."""
 
-    response = httpx.get(LATEST_RELEASE_URL, headers=headers)
-    release_info = _ReleaseInfo.parse_raw(response.content)
+    content = metadata_cache.get(LATEST_RELEASE_URL, ttl=LATEST_RELEASE_TTL)
+    release_info = _ReleaseInfo.parse_raw(content)
 
     return release_info.tag_name
 
@@ -0,0 +1,140 @@
+# SPDX-FileCopyrightText: 2022-present Manuel Quarneti <manuelquarneti@gmail.com>
+#
+# SPDX-License-Identifier: GPL-3.0-only
+
+import hashlib
+import re
+import time
+from os import makedirs, path
+from typing import Any, Optional
+
+import httpx
+from pydantic import BaseModel
+
+from . import METADATA_CACHE_DIR, mirrors, write_atomic
+
+_MAX_AGE_PATTERN = re.compile(r"max-age=(\d+)")
+
+
+class _Entry(BaseModel):
+    url: str
+    fetched_at: float
+    max_age: Optional[float] = None  # from Cache-Control
+    must_revalidate: bool = False
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+
+
+def _get_key(url: str, params: Optional[dict[str, Any]]) -> str:
+    request_url = httpx.URL(url, params=params)
+
+    return hashlib.sha1(str(request_url).encode()).hexdigest()
+
+
+def _get_paths(key: str) -> tuple[str, str]:
+    return (
+        path.join(METADATA_CACHE_DIR, f"{key}.json"),
+        path.join(METADATA_CACHE_DIR, f"{key}.body"),
+    )
+
+
+def _load(key: str) -> Optional[tuple[_Entry, str]]:
+    entry_path, body_path = _get_paths(key)
+    if not path.exists(entry_path) or not path.exists(body_path):
+        return None
+
+    try:
+        return _Entry.parse_file(entry_path), body_path
+    except Exception as e:
+        print(f"Ignoring broken metadata cache entry {entry_path}: {e}")
+        return None
+
+
+def _save(key: str, entry: _Entry, body: Optional[bytes]) -> None:
+    makedirs(METADATA_CACHE_DIR, exist_ok=True)
+    entry_path, body_path = _get_paths(key)
+
+    if body is not None:
+        write_atomic(body_path, body)
+    write_atomic(entry_path, entry.json().encode())
+
+
+def _is_fresh(entry: _Entry, ttl: float) -> bool:
+    if entry.must_revalidate:
+        return False
+
+    # The endpoint TTL, unless the server asks for less.
+    max_age = ttl if entry.max_age is None else min(ttl, entry.max_age)
+
+    return time.time() - entry.fetched_at < max_age
+
+
+def get_cached_path(url: str, params: Optional[dict[str, Any]] = None) -> Optional[str]:
+    """
+    Returns the file holding the cached body of url, fresh or not
+    """
+    cached = _load(_get_key(url, params))
+
+    return cached[1] if cached else None
+
+
+def get(
+    url: str,
+    ttl: float,
+    params: Optional[dict[str, Any]] = None,
+    headers: Optional[dict[str, str]] = None,
+) -> bytes:
+    """
+    GETs url through the on-disk cache. Entries younger than ttl seconds (or
+    the max-age sent by the server, if lower) are used without asking the
+    network; older ones are revalidated with If-None-Match and
+    If-Modified-Since. If the network is unreachable the stale entry is
+    returned instead.
+    """
+    key = _get_key(url, params)
+    cached = _load(key)
+
+    if cached and _is_fresh(cached[0], ttl):
+        with open(cached[1], "rb") as f:
+            return f.read()
+
+    request_headers = {"Accept-Encoding": "gzip"} | (headers or {})
+    if cached:
+        if cached[0].etag:
+            request_headers["If-None-Match"] = cached[0].etag
+        if cached[0].last_modified:
+            request_headers["If-Modified-Since"] = cached[0].last_modified
+
+    try:
+        response = mirrors.get(url, params=params, headers=request_headers)
+    except httpx.HTTPError as e:
+        if cached is None:
+            raise
+
+        print(f"Couldn't refresh {url} ({e}), using the cached copy")
+        with open(cached[1], "rb") as f:
+            return f.read()
+
+    cache_control = response.headers.get("Cache-Control", "").lower()
+    max_age_match = _MAX_AGE_PATTERN.search(cache_control)
+    entry = _Entry(
+        url=url,
+        fetched_at=time.time(),
+        max_age=float(max_age_match[1]) if max_age_match else None,
+        must_revalidate="no-cache" in cache_control,
+        etag=response.headers.get("ETag"),
+        last_modified=response.headers.get("Last-Modified"),
+    )
+
+    if response.status_code == 304 and cached:
+        # Still valid, only the entry gets refreshed.
+        if entry.etag is None and entry.last_modified is None:
+            entry.etag, entry.last_modified = cached[0].etag, cached[0].last_modified
+        _save(key, entry, None)
+        with open(cached[1], "rb") as f:
+            return f.read()
+
+    if "no-store" not in cache_control:
+        _save(key, entry, response.content)
+
+    return response.content
@@ -2,25 +2,31 @@
 #
 # SPDX-License-Identifier: GPL-3.0-only
 
-from multiprocessing.pool import AsyncResult, ThreadPool
+import json
+import os
+import struct
+from array import array
+from concurrent.futures import ThreadPoolExecutor
 from os import makedirs, path
-from pathlib import Path
-from typing import Final
+from typing import Final, Iterator, Optional
 
 from pydantic import BaseModel, HttpUrl
 
-from . import ASSETS_DIR, ProgressCallbacks, __version__, download_file
+from . import (
+    ASSETS_DIR,
+    Download,
+    DownloadPriority,
+    ProgressCallbacks,
+    download_file,
+    store_layers,
+    write_atomic,
+)
+from .file_clone import clone_file
 
 ASSETS_DOWNLOAD_ENDPOINT: Final[str] = "https://resources.download.minecraft.net"
-
-
-class _ObjectInfo(BaseModel):
-    hash: str
-    size: int
-
-
-class _Assets(BaseModel):
-    objects: dict[str, _ObjectInfo]
+ASSET_INDEX_CACHE_MAGIC: Final[bytes] = b"ICEAIDX1"
+_CACHE_HEADER: Final[struct.Struct] = struct.Struct("<8sI??")
+LAYOUT_STAMP_NAME: Final[str] = ".ice-launcher-layout"
 
 
 class AssetIndex(BaseModel):
@@ -31,47 +37,250 @@ class AssetIndex(BaseModel):
     url: HttpUrl
 
 
-def get_total_assets_size(asset_index: AssetIndex) -> int:
-    return asset_index.size + asset_index.totalSize
+class AssetObjects:
+    """
+    The objects of an asset index, kept as parallel arrays: names, packed
+    20 byte SHA-1 hashes and sizes
+    """
+
+    def __init__(
+        self,
+        names: list[str],
+        hashes: bytes,
+        sizes: array,
+        is_virtual: bool = False,
+        map_to_resources: bool = False,
+    ) -> None:
+        self.names = names
+        self.hashes = hashes
+        self.sizes = sizes
+        self.is_virtual = is_virtual
+        self.map_to_resources = map_to_resources
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def get_hash(self, index: int) -> str:
+        return self.hashes[index * 20 : (index + 1) * 20].hex()
+
+    def __iter__(self) -> Iterator[tuple[str, str, int]]:
+        """
+        Yields the name, hex hash and size of every object
+        """
+        for index, name in enumerate(self.names):
+            yield name, self.get_hash(index), self.sizes[index]
+
+    @classmethod
+    def parse_file(cls, index_path: str) -> "AssetObjects":
+        with open(index_path, "rb") as f:
+            index = json.load(f)
+
+        names = []
+        hashes = bytearray()
+        sizes = array("Q")
+        for name, info in index["objects"].items():
+            names.append(name)
+            hashes += bytes.fromhex(info["hash"])
+            sizes.append(info["size"])
+
+        return cls(
+            names,
+            bytes(hashes),
+            sizes,
+            index.get("virtual", False),
+            index.get("map_to_resources", False),
+        )
+
+    @classmethod
+    def load_cache(cls, cache_path: str) -> "AssetObjects":
+        with open(cache_path, "rb") as f:
+            data = f.read()
+
+        magic, count, is_virtual, map_to_resources = _CACHE_HEADER.unpack_from(data)
+        if magic != ASSET_INDEX_CACHE_MAGIC:
+            raise Exception(f"{cache_path} is not an asset index cache")
+
+        offset = _CACHE_HEADER.size
+        hashes = data[offset : offset + count * 20]
+        offset += count * 20
+
+        sizes = array("Q")
+        sizes.frombytes(data[offset : offset + count * sizes.itemsize])
+        offset += count * sizes.itemsize
+
+        names = data[offset:].decode().split("\0") if count else []
+        if len(hashes) != count * 20 or len(sizes) != count or len(names) != count:
+            raise Exception(f"{cache_path} is truncated")
+
+        return cls(names, hashes, sizes, is_virtual, map_to_resources)
+
+    def save_cache(self, cache_path: str) -> None:
+        write_atomic(
+            cache_path,
+            _CACHE_HEADER.pack(
+                ASSET_INDEX_CACHE_MAGIC,
+                len(self),
+                self.is_virtual,
+                self.map_to_resources,
+            ),
+            self.hashes,
+            self.sizes.tobytes(),
+            "\0".join(self.names).encode(),
+        )
+
+
+def load_asset_objects(asset_index: AssetIndex) -> AssetObjects:
+    """
+    Reads an already downloaded asset index, through a binary cache keyed
+    by the index SHA-1
+    """
+    asset_index_path = path.join(ASSETS_DIR, "indexes", f"{asset_index.id}.json")
+    cache_path = path.join(ASSETS_DIR, "indexes", f"{asset_index.sha1}.bin")
+
+    if path.exists(cache_path):
+        try:
+            return AssetObjects.load_cache(cache_path)
+        except Exception as e:
+            print(f"Ignoring asset index cache {cache_path}: {e}")
+
+    objects = AssetObjects.parse_file(asset_index_path)
+    objects.save_cache(cache_path)
 
+    return objects
 
-def install_assets(
-    asset_index: AssetIndex, callbacks: ProgressCallbacks, pool: ThreadPool
-) -> list[AsyncResult]:
-    makedirs(ASSETS_DIR, exist_ok=True)
-    makedirs(path.join(ASSETS_DIR, "indexes"), exist_ok=True)
-    makedirs(path.join(ASSETS_DIR, "objects"), exist_ok=True)
 
+def get_assets_downloads(
+    asset_index: AssetIndex, callbacks: Optional[ProgressCallbacks] = None
+) -> list[Download]:
     asset_index_path = path.join(ASSETS_DIR, "indexes", f"{asset_index.id}.json")
     download_file(
         url=asset_index.url,
         dest=asset_index_path,
         sha1hash=asset_index.sha1,
         callbacks=callbacks,
+        size=asset_index.size,
     )
-    assets = _Assets.parse_file(asset_index_path)
+    objects = load_asset_objects(asset_index)
 
-    results = []
-    for asset_info in assets.objects.values():
-        asset_path = path.join(
-            ASSETS_DIR, "objects", asset_info.hash[:2], asset_info.hash
+    downloads = []
+    for _, sha1hash, size in objects:
+        prefix = sha1hash[:2]
+
+        # The values come straight from a verified index, skip validation.
+        download = Download.construct(
+            url=f"{ASSETS_DOWNLOAD_ENDPOINT}/{prefix}/{sha1hash}",
+            dest=path.join(ASSETS_DIR, "objects", prefix, sha1hash),
+            sha1hash=sha1hash,
+            size=size,
+            priority=DownloadPriority.assets,
         )
-        asset_url = (
-            f"{ASSETS_DOWNLOAD_ENDPOINT}/{asset_info.hash[:2]}/{asset_info.hash}"
+        downloads.append(download)
+
+    return downloads
+
+
+def get_layout_dir(asset_index: AssetIndex, game_dir: str) -> Optional[str]:
+    """
+    Returns where a legacy version expects its assets with their real names,
+    or None for versions reading the hashed object store
+    """
+    objects = load_asset_objects(asset_index)
+
+    if objects.map_to_resources:
+        return path.join(game_dir, "resources")
+    if objects.is_virtual:
+        return path.join(ASSETS_DIR, "virtual", asset_index.id)
+
+    return None
+
+
+def materialize_assets(asset_index: AssetIndex, game_dir: str) -> Optional[str]:
+    """
+    Builds the legacy asset layout of a version (see get_layout_dir) out of
+    links into the object store, and returns its path. A stamp holding the
+    index SHA-1 makes rebuilding an unchanged layout a single read.
+    """
+    layout_dir = get_layout_dir(asset_index, game_dir)
+    if layout_dir is None:
+        return None
+
+    stamp_path = path.join(layout_dir, LAYOUT_STAMP_NAME)
+    if path.exists(stamp_path):
+        with open(stamp_path) as f:
+            if f.read() == asset_index.sha1:
+                return layout_dir
+
+    print(f"Building asset layout in {layout_dir}")
+    objects = load_asset_objects(asset_index)
+    objects_dir = path.join(ASSETS_DIR, "objects")
+
+    links = []
+    for name, sha1hash, size in objects:
+        source = store_layers.resolve(
+            path.join(objects_dir, sha1hash[:2], sha1hash), size, sha1hash
         )
+        links.append((source, path.join(layout_dir, *name.split("/"))))
 
-        parent_dir = Path(asset_path).parent.absolute()
+    for parent_dir in {path.dirname(dest) for _, dest in links}:
         makedirs(parent_dir, exist_ok=True)
 
-        result = pool.apply_async(
-            download_file,
-            (
-                asset_url,
-                asset_path,
-                asset_info.hash,
-                callbacks,
-            ),
+    # Links are cheap but there are thousands of them, one syscall each.
+    with ThreadPoolExecutor(max_workers=os.cpu_count()) as executor:
+        list(executor.map(lambda link: clone_file(*link), links))
+
+    with open(stamp_path, "w") as f:
+        f.write(asset_index.sha1)
+
+    return layout_dir
+
+
+def get_assets_root(asset_index: AssetIndex) -> str:
+    """
+    Returns the assets dir to start the game with. The game reads every
+    object from a single root, so the first layer holding all of them is
+    picked; if none does, the objects found only in shared stores are
+    copied into the local one.
+    """
+    layers = store_layers.get_layers()
+    if len(layers) == 1:
+        return ASSETS_DIR
+
+    objects = load_asset_objects(asset_index)
+    files = [
+        (path.join("objects", sha1hash[:2], sha1hash), size, sha1hash)
+        for _, sha1hash, size in objects
+    ]
+    files.append(
+        (
+            path.join("indexes", f"{asset_index.id}.json"),
+            asset_index.size,
+            asset_index.sha1,
         )
-        results.append(result)
+    )
+
+    # Shared copies count only if the install planner would accept them.
+    for layer in layers[:-1]:
+        assets_root = path.join(layer, path.relpath(ASSETS_DIR, layers[-1]))
+        if all(
+            store_layers.is_shared_copy_valid(
+                path.join(assets_root, relative_path), size, sha1hash
+            )
+            for relative_path, size, sha1hash in files
+        ):
+            return assets_root
+
+    if all(
+        path.exists(path.join(ASSETS_DIR, relative_path))
+        for relative_path, _, _ in files
+    ):
+        return ASSETS_DIR
+
+    print("No store holds every asset, completing the local one")
+    for relative_path, size, sha1hash in files:
+        local_path = path.join(ASSETS_DIR, relative_path)
+        if not path.exists(local_path):
+            source = store_layers.resolve(local_path, size, sha1hash)
+            makedirs(path.dirname(local_path), exist_ok=True)
+            clone_file(source, local_path)
 
-    return results
+    return ASSETS_DIR
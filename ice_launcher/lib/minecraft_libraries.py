@@ -3,15 +3,14 @@
 # SPDX-License-Identifier: GPL-3.0-only
 
 import platform
-from multiprocessing.pool import AsyncResult, ThreadPool
-from os import makedirs, path
-from pathlib import Path
+from functools import cache
+from os import path
 from typing import Optional
 
 from pydantic import BaseModel, HttpUrl
 
-from . import LIBRARIES_DIR, ProgressCallbacks, download_file
-from .minecraft_rules import Rule, is_rule_list_valid
+from . import LIBRARIES_DIR, Download, DownloadPriority
+from .minecraft_rules import Rule, get_platform_context, is_rule_list_valid
 
 
 class _Artifact(BaseModel):
@@ -22,14 +21,33 @@ class _Artifact(BaseModel):
 
 
 class _Downloads(BaseModel):
-    artifact: _Artifact
+    artifact: Optional[_Artifact]  # missing for natives-only libraries
+    classifiers: Optional[dict[str, _Artifact]]  # before 1.19
     rules: Optional[list[Rule]]
 
 
+class _Extract(BaseModel):
+    exclude: list[str] = []
+
+
 class Library(BaseModel):
     downloads: _Downloads
+    natives: Optional[dict[str, str]]  # os name -> classifier, before 1.19
+    extract: Optional[_Extract]
+    rules: Optional[list[Rule]]
 
+    def get_all_artifacts(self) -> list[_Artifact]:
+        """
+        Returns the artifact and the classifiers of every platform
+        """
+        artifacts = list((self.downloads.classifiers or {}).values())
+        if self.downloads.artifact:
+            artifacts.append(self.downloads.artifact)
 
+        return artifacts
+
+
+@cache
 def get_natives_string() -> str:
     """
     Returns the natives string for the current system
@@ -53,58 +71,73 @@ def get_natives_string() -> str:
     raise Exception("Unsupported platform")
 
 
-def get_total_libraries_size(libraries: list[Library]) -> int:
-    return sum(library.downloads.artifact.size for library in libraries)
+def _is_artifact_valid(artifact: _Artifact) -> bool:
+    natives_string = get_natives_string()
+    arch = get_platform_context().os_arch
 
+    if "natives" in artifact.path and natives_string not in artifact.path:
+        return False
+    if "x86_64" in artifact.path and arch != "x86_64":
+        return False
+    if "aarch_64" in artifact.path and arch != "arm64":
+        return False
+
+    return True
 
-def get_valid_artifacts(libraries: list[Library]) -> list[_Artifact]:
-    natives_string = get_natives_string()
 
+def _get_natives_classifier(library: Library) -> Optional[_Artifact]:
+    """
+    Returns the natives jar of a pre-1.19 library for the current system
+    """
+    if not library.natives or not library.downloads.classifiers:
+        return None
+
+    context = get_platform_context()
+    classifier = library.natives.get(context.os_name)
+    if classifier is None:
+        return None
+
+    classifier = classifier.replace(
+        "${arch}", "32" if context.os_arch == "x86" else "64"
+    )
+
+    return library.downloads.classifiers.get(classifier)
+
+
+def get_valid_artifacts(libraries: list[Library]) -> list[_Artifact]:
     valid_artifacts = []
     for library in libraries:
+        # Mojang puts rules on the library, older metas next to the downloads.
+        if library.rules and not is_rule_list_valid(library.rules):
+            continue
         if library.downloads.rules and not is_rule_list_valid(library.downloads.rules):
             continue
 
-        if "natives" in library.downloads.artifact.path:
-            if natives_string not in library.downloads.artifact.path:
-                continue
-
-        if (
-            "x86_64" in library.downloads.artifact.path
-            and platform.machine() != "x86_64"
-        ):
-            continue
-        if (
-            "aarch_64" in library.downloads.artifact.path
-            and platform.machine() != "aarch64"
-        ):
-            continue
+        artifact = library.downloads.artifact
+        if artifact and _is_artifact_valid(artifact):
+            valid_artifacts.append(artifact)
 
-        valid_artifacts.append(library.downloads.artifact)
+        # Picked by os name already, their paths don't follow natives_string.
+        natives_classifier = _get_natives_classifier(library)
+        if natives_classifier:
+            valid_artifacts.append(natives_classifier)
 
     return valid_artifacts
 
 
-def install_libraries(
-    libraries: list[Library], callbacks: ProgressCallbacks, pool: ThreadPool
-) -> list[AsyncResult]:
+def get_libraries_downloads(libraries: list[Library]) -> list[Download]:
     artifacts = get_valid_artifacts(libraries)
 
-    results = []
+    downloads = []
     for artifact in artifacts:
         library_path = path.join(LIBRARIES_DIR, artifact.path)
-        parent_dir = Path(library_path).parent.absolute()
-        makedirs(parent_dir, exist_ok=True)
-
-        result = pool.apply_async(
-            download_file,
-            (
-                artifact.url,
-                library_path,
-                artifact.sha1,
-                callbacks,
-            ),
+        download = Download(
+            url=artifact.url,
+            dest=library_path,
+            sha1hash=artifact.sha1,
+            size=artifact.size,
+            priority=DownloadPriority.libraries,
         )
-        results.append(result)
+        downloads.append(download)
 
-    return results
+    return downloads
@@ -5,16 +5,14 @@
 from enum import Enum
 from typing import Final, Optional
 
-import httpx
 from pydantic import BaseModel
 
-from . import headers
+from . import metadata_cache
 
 MINECRAFT_NEWS_URL: Final[
     str
 ] = "https://www.minecraft.net/content/minecraft-net/_jcr_content.articles.grid"
-
-http_client = httpx.Client(headers=headers)
+MINECRAFT_NEWS_TTL: Final[int] = 3600  # 1 hour
 
 
 class _ArticleLang(str, Enum):
@@ -82,7 +80,9 @@ def fetch(page_size: int = 20) -> Articles:
     """
 
     parameters = {"pageSize": page_size}
-    response = http_client.get(MINECRAFT_NEWS_URL, params=parameters)
-    articles = Articles.parse_raw(response.content)
+    content = metadata_cache.get(
+        MINECRAFT_NEWS_URL, ttl=MINECRAFT_NEWS_TTL, params=parameters
+    )
+    articles = Articles.parse_raw(content)
 
     return articles
@@ -3,14 +3,17 @@
 # SPDX-License-Identifier: GPL-3.0-only
 
 import platform
+import re
 from enum import Enum
-from typing import Optional
+from functools import cache, lru_cache
+from typing import Callable, Final, Optional
 
 from pydantic import BaseModel
 
 
 class _Action(str, Enum):
     allow = "allow"
+    disallow = "disallow"
 
 
 class _OsName(str, Enum):
@@ -20,28 +23,134 @@ class _OsName(str, Enum):
 
 
 class _Os(BaseModel):
-    name: _OsName
-
-
-class _Feature(str, Enum):
-    is_demo_user = "is_demo_user"
-    has_custom_resolution = "has_custom_resolution"
+    name: Optional[_OsName]
+    version: Optional[str]  # regular expression
+    arch: Optional[str]
 
 
 class Rule(BaseModel):
     action: _Action
     os: Optional[_Os]
-    features: Optional[dict[_Feature, bool]]
-
-
-def is_rule_list_valid(rules: list[Rule]) -> bool:
-    os_name = platform.system().lower().replace("darwin", "osx")
+    features: Optional[dict[str, bool]]
+
+
+class PlatformContext(BaseModel):
+    os_name: str
+    os_version: str
+    os_arch: str
+
 
-    for rule in rules:
-        if rule.features:
-            return False
-        if rule.os:
-            if rule.action == _Action.allow and rule.os.name == os_name:
-                return True
+_ARCHES = {
+    "amd64": "x86_64",
+    "x86_64": "x86_64",
+    "x86": "x86",
+    "i386": "x86",
+    "i686": "x86",
+    "arm64": "arm64",
+    "aarch64": "arm64",
+}
 
-    return False
+MAX_COMPILED_RULE_LISTS: Final[int] = 256
+
+# (action, os name, os version, os arch, features) of each rule in a list.
+_RuleListKey = tuple[
+    tuple[str, Optional[str], Optional[str], Optional[str], tuple], ...
+]
+
+
+@cache
+def get_platform_context() -> PlatformContext:
+    """
+    The values rules are matched against, read once
+    """
+    system = platform.system()
+
+    if system == "Darwin":
+        os_version = platform.mac_ver()[0]
+    elif system == "Windows":
+        os_version = platform.version()
+    else:
+        os_version = platform.release()
+
+    machine = platform.machine().lower()
+
+    return PlatformContext(
+        os_name=system.lower().replace("darwin", "osx"),
+        os_version=os_version,
+        os_arch=_ARCHES.get(machine, machine),
+    )
+
+
+def _is_os_matching(os: _Os, context: PlatformContext) -> bool:
+    if os.name and os.name != context.os_name:
+        return False
+    if os.version and not re.search(os.version, context.os_version):
+        return False
+    if os.arch and _ARCHES.get(os.arch, os.arch) != context.os_arch:
+        return False
+
+    return True
+
+
+def _get_key(rules: list[Rule]) -> _RuleListKey:
+    return tuple(
+        (
+            rule.action.value,
+            rule.os.name.value if rule.os and rule.os.name else None,
+            rule.os.version if rule.os else None,
+            rule.os.arch if rule.os else None,
+            tuple(sorted((rule.features or {}).items())),
+        )
+        for rule in rules
+    )
+
+
+@lru_cache(maxsize=MAX_COMPILED_RULE_LISTS)
+def _compile(key: _RuleListKey) -> Callable[[frozenset[str]], bool]:
+    context = get_platform_context()
+
+    # Rules for another platform can never match, drop them now.
+    steps = [
+        (action == _Action.allow.value, dict(features))
+        for action, os_name, os_version, os_arch, features in key
+        if _is_os_matching(_Os(name=os_name, version=os_version, arch=os_arch), context)
+    ]
+
+    if not any(features for _, features in steps):
+        # Without feature conditions the last matching rule always wins.
+        result = steps[-1][0] if steps else False
+
+        def predicate(enabled_features: frozenset[str]) -> bool:
+            return result
+
+    else:
+
+        def predicate(enabled_features: frozenset[str]) -> bool:
+            # Nothing is allowed unless a rule says so, and later rules win.
+            is_allowed = False
+            for allow, features in steps:
+                if all(
+                    (feature in enabled_features) == value
+                    for feature, value in features.items()
+                ):
+                    is_allowed = allow
+
+            return is_allowed
+
+    return predicate
+
+
+def compile_rules(rules: list[Rule]) -> Callable[[frozenset[str]], bool]:
+    """
+    Turns a rule list into a predicate over the enabled features. The
+    platform part is settled here, once per distinct list: metas repeat
+    the same few rule lists, so the cache stays small and keeps hitting
+    across parses of the version meta.
+    """
+    return _compile(_get_key(rules))
+
+
+def is_rule_list_valid(
+    rules: list[Rule], enabled_features: frozenset[str] = frozenset()
+) -> bool:
+    return compile_rules(rules)(enabled_features)
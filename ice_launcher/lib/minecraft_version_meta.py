@@ -3,12 +3,12 @@
 # SPDX-License-Identifier: GPL-3.0-only
 
 import platform
-from multiprocessing.pool import AsyncResult, ThreadPool
 from os import path
+from typing import Optional
 
 from pydantic import BaseModel, HttpUrl
 
-from . import LIBRARIES_DIR, VERSIONS_DIR, ProgressCallbacks, download_file
+from . import LIBRARIES_DIR, VERSIONS_DIR, Download, DownloadPriority, store_layers
 from .minecraft_assets import AssetIndex
 from .minecraft_libraries import Library, get_valid_artifacts
 from .minecraft_rules import Rule
@@ -38,7 +38,8 @@ class _JavaVersion(BaseModel):
 
 
 class MinecraftVersionMeta(BaseModel):
-    arguments: _Arguments
+    arguments: Optional[_Arguments]
+    minecraftArguments: Optional[str]  # before 1.13
     assetIndex: AssetIndex
     downloads: _Downloads
     javaVersion: _JavaVersion
@@ -46,41 +47,54 @@ class MinecraftVersionMeta(BaseModel):
     mainClass: str
 
 
+def get_version_meta_path(version_id: str) -> str:
+    return path.join(VERSIONS_DIR, version_id, "meta.json")
+
+
 def get_version_meta(version_id: str) -> MinecraftVersionMeta:
-    version_meta_path = path.join(VERSIONS_DIR, version_id, "meta.json")
+    version_meta_path = get_version_meta_path(version_id)
     version_meta = MinecraftVersionMeta.parse_file(version_meta_path)
 
     return version_meta
 
 
-def install_client(
-    version_id: str, artifact: _Artifact, callbacks: ProgressCallbacks, pool: ThreadPool
-) -> list[AsyncResult]:
+def get_client_download(version_id: str, artifact: _Artifact) -> Download:
     client_path = path.join(VERSIONS_DIR, version_id, "client.jar")
 
-    result = pool.apply_async(
-        download_file,
-        (
-            artifact.url,
-            client_path,
-            artifact.sha1,
-            callbacks,
-        ),
+    # The client is on the launch critical path, so it goes first.
+    download = Download(
+        url=artifact.url,
+        dest=client_path,
+        sha1hash=artifact.sha1,
+        size=artifact.size,
+        priority=DownloadPriority.critical,
     )
 
-    return [result]
+    return download
 
 
 def get_client_path(version_id: str) -> str:
     return path.join(VERSIONS_DIR, version_id, "client.jar")
 
 
-def get_classpath_string(libraries: list[Library], minecraft_version: str) -> str:
+def get_classpath_string(
+    libraries: list[Library], minecraft_version: str, client: _Artifact
+) -> str:
     classpath_separator = ";" if platform.system() == "Windows" else ":"
     artifacts = get_valid_artifacts(libraries)
 
-    jars = [path.join(LIBRARIES_DIR, artifact.path) for artifact in artifacts]
-    jars.append(get_client_path(minecraft_version))
+    # Each jar is taken from the first store layer with a valid copy.
+    jars = [
+        store_layers.resolve(
+            path.join(LIBRARIES_DIR, artifact.path), artifact.size, artifact.sha1
+        )
+        for artifact in artifacts
+    ]
+    jars.append(
+        store_layers.resolve(
+            get_client_path(minecraft_version), client.size, client.sha1
+        )
+    )
 
     classpath_string = classpath_separator.join(jars)
 
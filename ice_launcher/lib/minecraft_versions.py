@@ -2,22 +2,36 @@
 #
 # SPDX-License-Identifier: GPL-3.0-only
 
+import bisect
+import re
+import time
+from concurrent.futures import wait
 from enum import Enum
-from multiprocessing.pool import ThreadPool
-from os import makedirs, path
-from typing import Final
+from typing import Final, Iterable, Optional
 
-import httpx
 from pydantic import BaseModel, HttpUrl
 
-from . import VERSION_MANIFESTS_DIR, ProgressCallbacks, download_file, headers
-from .minecraft_assets import get_total_assets_size, install_assets
-from .minecraft_libraries import get_total_libraries_size, install_libraries
-from .minecraft_version_meta import MinecraftVersionMeta, install_client
+from . import (
+    Download,
+    ProgressCallbacks,
+    download_file,
+    downloader,
+    metadata_cache,
+    submit_downloads,
+)
+from .install_planner import InstallPlan, plan_downloads
+from .minecraft_assets import get_assets_downloads
+from .minecraft_libraries import get_libraries_downloads
+from .minecraft_version_meta import (
+    MinecraftVersionMeta,
+    get_client_download,
+    get_version_meta_path,
+)
 
 VERSION_MANIFEST_URL: Final[
     str
 ] = "https://piston-meta.mojang.com/mc/game/version_manifest_v2.json"
+VERSION_MANIFEST_TTL: Final[int] = 600  # 10 minutes
 
 
 class _TypeEnum(str, Enum):
@@ -44,19 +58,194 @@ class MinecraftVersionManifest(BaseModel):
     versions: list[MinecraftVersionInfo]
 
 
+class InstallStats(BaseModel):
+    files: int
+    downloaded_files: int
+    downloaded_bytes: int
+    duration: float
+    concurrency: int
+    peak_concurrency: int
+
+
+class MissingFilesError(Exception):
+    def __init__(self, files: list[str]) -> None:
+        super().__init__(f"{len(files)} files could not be downloaded")
+        self.files = files
+
+
+def _normalize(text: str) -> str:
+    """
+    Lowercase and without separators, so that "119" finds "1.19"
+    """
+    return re.sub(r"[^0-9a-z]", "", text.lower())
+
+
+def _is_subsequence(query: str, text: str) -> bool:
+    characters = iter(text)
+
+    return all(character in characters for character in query)
+
+
+class VersionIndex:
+    """
+    The versions of the manifest, indexed by id and type and with a sorted
+    list of ids for prefix search. Versions keep the manifest order,
+    newest first.
+    """
+
+    def __init__(self, manifest: MinecraftVersionManifest) -> None:
+        self.latest = manifest.latest
+        self.versions = manifest.versions
+        self.by_id = {version.id: version for version in self.versions}
+        self.positions = {version.id: i for i, version in enumerate(self.versions)}
+
+        self.by_type: dict[str, list[MinecraftVersionInfo]] = {}
+        for version in self.versions:
+            self.by_type.setdefault(version.type.value, []).append(version)
+
+        self.sorted_ids = sorted(
+            (version.id.lower(), version.id) for version in self.versions
+        )
+        self.normalized_ids = [
+            (version, _normalize(version.id)) for version in self.versions
+        ]
+
+    def __len__(self) -> int:
+        return len(self.versions)
+
+    def get(self, version_id: str) -> Optional[MinecraftVersionInfo]:
+        return self.by_id.get(version_id)
+
+    def _with_prefix(self, prefix: str) -> list[str]:
+        start = bisect.bisect_left(self.sorted_ids, (prefix,))
+        matches = []
+        for lowered, version_id in self.sorted_ids[start:]:
+            if not lowered.startswith(prefix):
+                break
+            matches.append(version_id)
+
+        return matches
+
+    def search(
+        self,
+        query: str = "",
+        types: Optional[Iterable[str]] = None,
+        limit: Optional[int] = None,
+    ) -> list[MinecraftVersionInfo]:
+        """
+        Returns the versions of the given types matching query: exact
+        matches first, then prefix matches, then fuzzy ones (the query
+        letters appear in order, separators ignored). Otherwise versions
+        keep the manifest order.
+        """
+        type_filter = set(types) if types is not None else None
+
+        def is_wanted(version: MinecraftVersionInfo) -> bool:
+            return type_filter is None or version.type.value in type_filter
+
+        query = query.strip().lower()
+        if not query:
+            if type_filter is None:
+                candidates = self.versions
+            else:
+                # Merged back into manifest order.
+                candidates = sorted(
+                    (
+                        version
+                        for version_type in type_filter
+                        for version in self.by_type.get(version_type, [])
+                    ),
+                    key=lambda version: self.positions[version.id],
+                )
+
+            return candidates[:limit]
+
+        prefix_ids = self._with_prefix(query)
+        prefix_matches = sorted(prefix_ids, key=self.positions.__getitem__)
+        results = [
+            self.by_id[version_id]
+            for version_id in prefix_matches
+            if is_wanted(self.by_id[version_id])
+        ]
+
+        # The exact match, if any, goes first.
+        results.sort(key=lambda version: version.id.lower() != query)
+
+        normalized_query = _normalize(query)
+        if normalized_query and (limit is None or len(results) < limit):
+            seen = set(prefix_ids)
+            fuzzy_matches = [
+                (version, normalized_id)
+                for version, normalized_id in self.normalized_ids
+                if version.id not in seen
+                and is_wanted(version)
+                and _is_subsequence(normalized_query, normalized_id)
+            ]
+
+            # "119" is closer to 1.19.2 than to 1.1.9, closer ones first.
+            fuzzy_matches.sort(
+                key=lambda match: not match[1].startswith(normalized_query)
+            )
+            results += [version for version, _ in fuzzy_matches]
+
+        return results[:limit]
+
+
 def fetch_manifest() -> MinecraftVersionManifest:
-    response = httpx.get(VERSION_MANIFEST_URL, headers=headers)
-    manifest = MinecraftVersionManifest.parse_raw(response.content)
+    content = metadata_cache.get(VERSION_MANIFEST_URL, ttl=VERSION_MANIFEST_TTL)
+    manifest = MinecraftVersionManifest.parse_raw(content)
 
     return manifest
 
 
-def install_version(
-    minecraft_version: MinecraftVersionInfo, callbacks: ProgressCallbacks
-) -> None:
-    makedirs(VERSION_MANIFESTS_DIR, exist_ok=True)
+def fetch_version_index() -> VersionIndex:
+    return VersionIndex(fetch_manifest())
+
+
+def get_version_downloads(
+    version_id: str,
+    version_meta: MinecraftVersionMeta,
+    callbacks: Optional[ProgressCallbacks] = None,
+) -> list[Download]:
+    """
+    Returns every file the version needs: assets, libraries and the client
+    """
+    downloads = get_assets_downloads(version_meta.assetIndex, callbacks)
+    downloads += get_libraries_downloads(version_meta.libraries)
+    downloads.append(get_client_download(version_id, version_meta.downloads.client))
+
+    return downloads
+
+
+def download_all(
+    downloads: list[Download], callbacks: Optional[ProgressCallbacks] = None
+) -> list[int]:
+    """
+    Downloads everything and returns the bytes received for each file.
+    Raises MissingFilesError listing the files that couldn't be downloaded.
+    """
+    # The engine orders the whole batch by priority class and size.
+    results = submit_downloads(downloads, callbacks)
+    wait(results)
+
+    missing_files = []
+    for download, result in zip(downloads, results):
+        if error := result.exception():
+            print(f"Failed to download {download.url} to {download.dest}: {error}")
+            missing_files.append(download.dest)
 
-    version_meta_path = path.join(VERSION_MANIFESTS_DIR, f"{minecraft_version.id}.json")
+    if missing_files:
+        raise MissingFilesError(missing_files)
+
+    return [result.result() for result in results]
+
+
+def plan_install(minecraft_version: MinecraftVersionInfo) -> InstallPlan:
+    """
+    Works out what installing the version would download. Only the version
+    meta and the asset index are fetched, so it can be used as a dry run.
+    """
+    version_meta_path = get_version_meta_path(minecraft_version.id)
     download_file(
         url=minecraft_version.url,
         dest=version_meta_path,
@@ -64,21 +253,39 @@ def install_version(
     )
 
     version_meta = MinecraftVersionMeta.parse_file(version_meta_path)
+    downloads = get_version_downloads(minecraft_version.id, version_meta)
+
+    return plan_downloads(downloads)
+
+
+def install_version(
+    minecraft_version: MinecraftVersionInfo, callbacks: ProgressCallbacks
+) -> InstallStats:
+    started = time.monotonic()
 
-    total_size = (
-        get_total_assets_size(version_meta.assetIndex)
-        + get_total_libraries_size(version_meta.libraries)
-        + version_meta.downloads.client.size
+    callbacks.set_status("Checking installed files")
+    plan = plan_install(minecraft_version)
+    print(
+        f"Install plan for {minecraft_version.id}: {len(plan.downloads)} files "
+        f"to fetch ({plan.transfer_bytes} bytes), {plan.present_files} present"
     )
+
+    # Only what is actually missing counts towards the progress.
     callbacks.set_status("Downloading required files")
-    callbacks.set_max(total_size)
+    callbacks.set_max(plan.fetch_bytes)
 
-    with ThreadPool() as pool:
-        results = install_assets(version_meta.assetIndex, callbacks, pool)
-        results += install_libraries(version_meta.libraries, callbacks, pool)
-        results += install_client(
-            minecraft_version.id, version_meta.downloads.client, callbacks, pool
-        )
+    downloader.reset_peak_concurrency()
+    received = download_all(plan.downloads, callbacks)
+
+    concurrency, peak_concurrency = downloader.get_concurrency()
+    stats = InstallStats(
+        files=plan.files,
+        downloaded_files=sum(1 for size in received if size),
+        downloaded_bytes=sum(received),
+        duration=time.monotonic() - started,
+        concurrency=concurrency,
+        peak_concurrency=peak_concurrency,
+    )
+    print(f"Installed {minecraft_version.id}: {stats}")
 
-        for result in results:
-            result.wait()
+    return stats
@@ -0,0 +1,71 @@
+# SPDX-FileCopyrightText: 2022-present Manuel Quarneti <manuelquarneti@gmail.com>
+#
+# SPDX-License-Identifier: GPL-3.0-only
+
+from functools import cache
+from typing import Any, Final
+
+import httpx
+
+from . import headers, launcher_config
+
+# Upstream base URLs of every artifact class, matching the fields of
+# launcher_config.Mirrors.
+UPSTREAM_ENDPOINTS: Final[dict[str, list[str]]] = {
+    "assets": ["https://resources.download.minecraft.net"],
+    "libraries": ["https://libraries.minecraft.net"],
+    "versions": [
+        "https://piston-meta.mojang.com",
+        "https://piston-data.mojang.com",
+        "https://launchermeta.mojang.com",
+        "https://launcher.mojang.com",
+    ],
+    "java": ["https://api.adoptium.net", "https://github.com/adoptium"],
+}
+
+
+@cache
+def _get_mirrors() -> launcher_config.Mirrors:
+    return launcher_config.read().mirrors
+
+
+def get_urls(url: str) -> list[str]:
+    """
+    Returns the URLs to try for url, mirrors first and upstream last
+    """
+    mirrors = _get_mirrors()
+
+    for artifact_class, endpoints in UPSTREAM_ENDPOINTS.items():
+        for endpoint in endpoints:
+            if url.startswith(endpoint):
+                url_path = url.removeprefix(endpoint)
+                bases: list[str] = getattr(mirrors, artifact_class)
+
+                return [f"{base.rstrip('/')}{url_path}" for base in bases] + [url]
+
+    return [url]
+
+
+def get(url: str, **kwargs: Any) -> httpx.Response:
+    """
+    GETs url from the first mirror that answers successfully
+    """
+    kwargs["headers"] = headers | kwargs.get("headers", {})
+    urls = get_urls(url)
+
+    for candidate in urls:
+        try:
+            response = httpx.get(candidate, follow_redirects=True, **kwargs)
+
+            # 304 answers a conditional request, it isn't a failure.
+            if response.is_error:
+                response.raise_for_status()
+
+            return response
+        except httpx.HTTPError as e:
+            if candidate == urls[-1]:
+                raise
+
+            print(f"{candidate} failed ({e}), trying the next mirror")
+
+    raise Exception("No URL to download from")
@@ -0,0 +1,109 @@
+# SPDX-FileCopyrightText: 2022-present Manuel Quarneti <manuelquarneti@gmail.com>
+#
+# SPDX-License-Identifier: GPL-3.0-only
+
+import hashlib
+import os
+import tempfile
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from os import makedirs, path
+from shutil import copyfileobj, rmtree
+from typing import Final
+
+from . import LIBRARIES_DIR, NATIVES_DIR, store_layers
+from .file_clone import clone_file
+from .minecraft_libraries import Library, get_valid_artifacts
+
+NATIVE_EXTENSIONS: Final[tuple[str, ...]] = (".so", ".dll", ".dylib", ".jnilib")
+
+
+def get_natives_jars(libraries: list[Library]) -> list[tuple[str, str]]:
+    """
+    Returns the path and SHA-1 of the natives jars for the current system
+    """
+    return [
+        (
+            store_layers.resolve(
+                path.join(LIBRARIES_DIR, artifact.path), artifact.size, artifact.sha1
+            ),
+            artifact.sha1,
+        )
+        for artifact in get_valid_artifacts(libraries)
+        if "natives" in artifact.path
+    ]
+
+
+def get_natives_set_id(jars: list[tuple[str, str]]) -> str:
+    sha1 = hashlib.sha1()
+    for _, jar_sha1 in sorted(jars, key=lambda jar: jar[1]):
+        sha1.update(jar_sha1.encode())
+
+    return sha1.hexdigest()
+
+
+def _publish(temp_dir: str, dest: str) -> None:
+    """
+    Moves a fully built directory into place, unless someone else did first
+    """
+    try:
+        os.replace(temp_dir, dest)
+    except OSError:
+        if not path.isdir(dest):
+            raise
+        rmtree(temp_dir)
+
+
+def _extract_jar(jar_path: str, jar_sha1: str) -> str:
+    cache_dir = path.join(NATIVES_DIR, jar_sha1)
+    if path.isdir(cache_dir):
+        return cache_dir
+
+    print(f"Extracting natives from {jar_path}")
+    makedirs(NATIVES_DIR, exist_ok=True)
+    temp_dir = tempfile.mkdtemp(dir=NATIVES_DIR)
+
+    try:
+        with zipfile.ZipFile(jar_path) as jar:
+            for member in jar.infolist():
+                name = path.basename(member.filename)
+                if member.is_dir() or not name.endswith(NATIVE_EXTENSIONS):
+                    continue
+
+                # Natives are loaded by file name, so the jar layout is flattened.
+                dest_path = path.join(temp_dir, name)
+                with jar.open(member) as src, open(dest_path, "wb") as dst:
+                    copyfileobj(src, dst)
+    except Exception:
+        rmtree(temp_dir)
+        raise
+
+    _publish(temp_dir, cache_dir)
+
+    return cache_dir
+
+
+def prepare_natives(libraries: list[Library]) -> str:
+    """
+    Returns a directory holding the natives of libraries, to be used as
+    java.library.path. Each jar is extracted once into a cache keyed by its
+    SHA-1, and every combination of jars is linked together once.
+    """
+    jars = get_natives_jars(libraries)
+    natives_dir = path.join(NATIVES_DIR, "sets", get_natives_set_id(jars))
+    if path.isdir(natives_dir):
+        return natives_dir
+
+    makedirs(path.join(NATIVES_DIR, "sets"), exist_ok=True)
+
+    with ThreadPoolExecutor(max_workers=os.cpu_count()) as executor:
+        cache_dirs = list(executor.map(lambda jar: _extract_jar(*jar), jars))
+
+    temp_dir = tempfile.mkdtemp(dir=path.join(NATIVES_DIR, "sets"))
+    for cache_dir in cache_dirs:
+        for name in os.listdir(cache_dir):
+            clone_file(path.join(cache_dir, name), path.join(temp_dir, name))
+
+    _publish(temp_dir, natives_dir)
+
+    return natives_dir
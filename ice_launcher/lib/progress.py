@@ -0,0 +1,117 @@
+# SPDX-FileCopyrightText: 2022-present Manuel Quarneti <manuelquarneti@gmail.com>
+#
+# SPDX-License-Identifier: GPL-3.0-only
+
+import time
+from collections import deque
+from threading import local
+from typing import Final, Optional
+
+from pydantic import BaseModel
+
+from . import ProgressCallbacks
+
+RATE_WINDOW: Final[float] = 3.0  # seconds
+
+
+class ProgressSample(BaseModel):
+    status: str
+    value: int
+    max: int
+    files: int
+    bytes_per_second: float
+    files_per_second: float
+    eta: Optional[float]
+
+    @property
+    def fraction(self) -> float:
+        return min(self.value / self.max, 1.0) if self.max else 0.0
+
+
+class ProgressAggregator:
+    """
+    Collects progress from download workers without taking any lock.
+    Every thread only ever writes to its own counters, and the GUI sums them
+    up at its own pace through sample().
+    """
+
+    def __init__(self) -> None:
+        self._local = local()
+        self._counters: list[list[int]] = []
+        self._status = ""
+        self._max = 0
+        self._offset = [0, 0]
+        self._history: deque[tuple[float, int, int]] = deque()
+
+    def _get_counter(self) -> list[int]:
+        counter = getattr(self._local, "counter", None)
+        if counter is None:
+            counter = [0, 0]  # bytes, files
+            self._local.counter = counter
+            self._counters.append(counter)
+
+        return counter
+
+    def _totals(self) -> tuple[int, int]:
+        counters = self._counters.copy()
+        total_bytes = sum(counter[0] for counter in counters) - self._offset[0]
+        total_files = sum(counter[1] for counter in counters) - self._offset[1]
+
+        return total_bytes, total_files
+
+    def increment_value_by(self, value: int) -> None:
+        self._get_counter()[0] += value
+
+    def increment_files_by(self, value: int) -> None:
+        self._get_counter()[1] += value
+
+    def set_max(self, value: int) -> None:
+        self._max = value
+
+    def set_status(self, status: str) -> None:
+        # A new status starts a new phase with its own rates.
+        self._status = status
+        self._history = deque()
+
+    def reset(self) -> None:
+        total_bytes, total_files = self._totals()
+        self._offset = [self._offset[0] + total_bytes, self._offset[1] + total_files]
+        self._max = 0
+        self._history = deque()
+
+    def get_callbacks(self) -> ProgressCallbacks:
+        return ProgressCallbacks(
+            set_max=self.set_max,
+            increment_value_by=self.increment_value_by,
+            increment_files_by=self.increment_files_by,
+            set_status=self.set_status,
+            reset=self.reset,
+        )
+
+    def sample(self) -> ProgressSample:
+        now = time.monotonic()
+        total_bytes, total_files = self._totals()
+
+        history = self._history
+        history.append((now, total_bytes, total_files))
+        while now - history[0][0] > RATE_WINDOW:
+            history.popleft()
+
+        then, then_bytes, then_files = history[0]
+        elapsed = now - then
+        bytes_per_second = (total_bytes - then_bytes) / elapsed if elapsed else 0.0
+        files_per_second = (total_files - then_files) / elapsed if elapsed else 0.0
+
+        eta = None
+        if bytes_per_second and self._max:
+            eta = max(self._max - total_bytes, 0) / bytes_per_second
+
+        return ProgressSample(
+            status=self._status,
+            value=total_bytes,
+            max=self._max,
+            files=total_files,
+            bytes_per_second=bytes_per_second,
+            files_per_second=files_per_second,
+            eta=eta,
+        )
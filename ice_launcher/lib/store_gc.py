@@ -0,0 +1,198 @@
+# SPDX-FileCopyrightText: 2022-present Manuel Quarneti <manuelquarneti@gmail.com>
+#
+# SPDX-License-Identifier: GPL-3.0-only
+
+import os
+import time
+from os import path
+from shutil import rmtree
+from typing import Final, Iterator
+
+from pydantic import BaseModel
+
+from . import (
+    ASSETS_DIR,
+    LIBRARIES_DIR,
+    NATIVES_DIR,
+    VERSIONS_DIR,
+    instances,
+    natives,
+    verification_index,
+)
+from .minecraft_assets import load_asset_objects
+from .minecraft_version_meta import get_version_meta
+
+GC_GRACE_PERIOD: Final[float] = 3600  # seconds
+
+# Leftovers of a download belong to the file being downloaded.
+_DOWNLOAD_SUFFIXES: Final[tuple[str, ...]] = (".part.segments", ".part", ".tmp")
+
+
+class GCReport(BaseModel):
+    referenced_versions: list[str]
+    referenced_files: int
+    unreferenced: list[str]
+    unreferenced_bytes: int
+    removed: bool
+
+
+def _mark() -> tuple[set[str], dict[str, set[str]]]:
+    """
+    Returns every file the instances need, and for each directory holding
+    per version data the names of the entries still in use
+    """
+    versions = set()
+    asset_indexes = set()
+    natives_dirs = {"sets"}
+    natives_sets = set()
+    files = set()
+
+    for instance_name in instances.list():
+        version_id = instances.read_info(instance_name).minecraft_version
+        if version_id in versions:
+            continue
+
+        # A version that can't be read would have all its files collected.
+        try:
+            version_meta = get_version_meta(version_id)
+            objects = load_asset_objects(version_meta.assetIndex)
+        except Exception as e:
+            raise Exception(
+                f"Can't read version {version_id} of {instance_name}, "
+                f"not collecting anything: {e}"
+            )
+
+        versions.add(version_id)
+
+        asset_index = version_meta.assetIndex
+        asset_indexes.add(asset_index.id)
+        indexes_dir = path.join(ASSETS_DIR, "indexes")
+        files.add(path.join(indexes_dir, f"{asset_index.id}.json"))
+        files.add(path.join(indexes_dir, f"{asset_index.sha1}.bin"))
+
+        objects_dir = path.join(ASSETS_DIR, "objects")
+        for index in range(len(objects)):
+            sha1hash = objects.get_hash(index)
+            files.add(path.join(objects_dir, sha1hash[:2], sha1hash))
+
+        # Libraries for every platform are kept, not only the current one.
+        for library in version_meta.libraries:
+            for artifact in library.get_all_artifacts():
+                files.add(path.join(LIBRARIES_DIR, *artifact.path.split("/")))
+
+        jars = natives.get_natives_jars(version_meta.libraries)
+        natives_dirs.update(jar_sha1 for _, jar_sha1 in jars)
+        natives_sets.add(natives.get_natives_set_id(jars))
+
+    # Legacy asset layouts go together with their asset index.
+    dirs = {
+        VERSIONS_DIR: versions,
+        path.join(ASSETS_DIR, "virtual"): asset_indexes,
+        NATIVES_DIR: natives_dirs,
+        path.join(NATIVES_DIR, "sets"): natives_sets,
+    }
+
+    return files, dirs
+
+
+def _walk(directory: str) -> Iterator[os.DirEntry]:
+    stack = [directory]
+    while stack:
+        try:
+            entries = os.scandir(stack.pop())
+        except FileNotFoundError:
+            continue
+
+        with entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                else:
+                    yield entry
+
+
+def _remove_empty_dirs(directory: str) -> None:
+    for dir_path, _, _ in os.walk(directory, topdown=False):
+        if dir_path != directory:
+            try:
+                os.rmdir(dir_path)
+            except OSError:
+                pass
+
+
+def collect_garbage(dry_run: bool = True) -> GCReport:
+    """
+    Mark and sweep over the assets, libraries, versions, legacy asset
+    layouts and natives: whatever no instance references is reported and,
+    unless dry_run, removed.
+    Files touched in the last GC_GRACE_PERIOD are left alone, since they
+    may belong to an install that is still running.
+    """
+    files, dirs = _mark()
+    deadline = time.time() - GC_GRACE_PERIOD
+
+    unreferenced = []
+    unreferenced_bytes = 0
+
+    store_dirs = (
+        path.join(ASSETS_DIR, "objects"),
+        path.join(ASSETS_DIR, "indexes"),
+        LIBRARIES_DIR,
+    )
+    for store_dir in store_dirs:
+        for entry in _walk(store_dir):
+            file_path = entry.path
+            for suffix in _DOWNLOAD_SUFFIXES:
+                file_path = file_path.removesuffix(suffix)
+            if file_path in files:
+                continue
+
+            st = entry.stat(follow_symlinks=False)
+            if st.st_mtime > deadline:
+                continue
+
+            unreferenced.append(entry.path)
+            unreferenced_bytes += st.st_size
+
+    unreferenced_dirs = []
+    for parent_dir, referenced in dirs.items():
+        if not path.isdir(parent_dir):
+            continue
+
+        for entry in os.scandir(parent_dir):
+            if not entry.is_dir() or entry.name in referenced:
+                continue
+            if entry.stat().st_mtime > deadline:
+                continue
+
+            unreferenced_dirs.append(entry.path)
+            unreferenced.append(entry.path)
+            unreferenced_bytes += sum(file.stat().st_size for file in _walk(entry.path))
+
+    if not dry_run:
+        for unreferenced_dir in unreferenced_dirs:
+            rmtree(unreferenced_dir)
+
+        store_files = [
+            file_path
+            for file_path in unreferenced
+            if file_path not in unreferenced_dirs
+        ]
+        for file_path in store_files:
+            os.remove(file_path)
+        verification_index.forget_many(store_files)
+
+        _remove_empty_dirs(LIBRARIES_DIR)
+
+    print(
+        f"{len(unreferenced)} unreferenced entries ({unreferenced_bytes} bytes)"
+        + ("" if dry_run else " removed")
+    )
+
+    return GCReport(
+        referenced_versions=sorted(dirs[VERSIONS_DIR]),
+        referenced_files=len(files),
+        unreferenced=unreferenced,
+        unreferenced_bytes=unreferenced_bytes,
+        removed=not dry_run,
+    )
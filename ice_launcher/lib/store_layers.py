@@ -0,0 +1,71 @@
+# SPDX-FileCopyrightText: 2022-present Manuel Quarneti <manuelquarneti@gmail.com>
+#
+# SPDX-License-Identifier: GPL-3.0-only
+
+from functools import cache
+from os import path
+from typing import Optional
+
+from . import dirs, launcher_config, verification_index
+
+
+@cache
+def get_layers() -> list[str]:
+    """
+    Returns the data dirs files are looked up in: the shared read-only
+    stores first, in the configured order, and the local one last
+    """
+    shared_stores = launcher_config.read().shared_stores
+
+    return [path.abspath(store) for store in shared_stores] + [dirs.user_data_dir]
+
+
+def get_candidates(local_path: str) -> list[str]:
+    """
+    Returns where a file of the local store could be found in every layer
+    """
+    relative_path = path.relpath(local_path, dirs.user_data_dir)
+    if relative_path.startswith(".."):
+        return [local_path]
+
+    return [path.join(layer, relative_path) for layer in get_layers()[:-1]] + [
+        local_path
+    ]
+
+
+def is_shared_copy_valid(
+    candidate: str, size: Optional[int] = None, sha1hash: Optional[str] = None
+) -> bool:
+    """
+    Returns True if a copy in a shared store has the expected size and was
+    verified against sha1hash, like the install planner accepts it
+    """
+    if not path.exists(candidate):
+        return False
+    if size is not None and path.getsize(candidate) != size:
+        return False
+
+    return sha1hash is None or verification_index.is_verified(candidate, sha1hash)
+
+
+def resolve(
+    local_path: str, size: Optional[int] = None, sha1hash: Optional[str] = None
+) -> str:
+    """
+    Returns the first shared copy of local_path that is valid, otherwise
+    local_path itself. A shared copy that was never verified is only used
+    when there is no local one.
+    """
+    candidates = get_candidates(local_path)[:-1]
+    for candidate in candidates:
+        if is_shared_copy_valid(candidate, size, sha1hash):
+            return candidate
+
+    if path.exists(local_path):
+        return local_path
+
+    for candidate in candidates:
+        if is_shared_copy_valid(candidate, size):
+            return candidate
+
+    return local_path
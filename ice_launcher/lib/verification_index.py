@@ -0,0 +1,111 @@
+# SPDX-FileCopyrightText: 2022-present Manuel Quarneti <manuelquarneti@gmail.com>
+#
+# SPDX-License-Identifier: GPL-3.0-only
+
+import sqlite3
+from os import path, stat
+from threading import Lock
+from typing import Optional
+
+from . import VERIFICATION_INDEX_PATH
+
+_connection: Optional[sqlite3.Connection] = None
+_lock = Lock()
+
+
+def _get_connection() -> sqlite3.Connection:
+    global _connection
+
+    if _connection is None:
+        _connection = sqlite3.connect(VERIFICATION_INDEX_PATH, check_same_thread=False)
+        _connection.execute("PRAGMA journal_mode=WAL")
+        _connection.execute("PRAGMA synchronous=NORMAL")
+        _connection.execute(
+            """
+            CREATE TABLE IF NOT EXISTS files (
+                path TEXT PRIMARY KEY,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                sha1 TEXT NOT NULL
+            )
+            """
+        )
+        _connection.execute("CREATE INDEX IF NOT EXISTS files_sha1 ON files (sha1)")
+        _connection.commit()
+
+    return _connection
+
+
+def is_verified(file_path: str, sha1hash: str) -> bool:
+    """
+    Returns True if the file was hashed before and its size and mtime
+    haven't changed since then
+    """
+    try:
+        st = stat(file_path)
+    except FileNotFoundError:
+        return False
+
+    with _lock:
+        row = (
+            _get_connection()
+            .execute(
+                "SELECT size, mtime_ns, sha1 FROM files WHERE path = ?",
+                (path.abspath(file_path),),
+            )
+            .fetchone()
+        )
+
+    return row == (st.st_size, st.st_mtime_ns, sha1hash)
+
+
+def find(sha1hash: str) -> Optional[str]:
+    """
+    Returns a file that matches sha1hash and is still unchanged, if any
+    """
+    with _lock:
+        rows = (
+            _get_connection()
+            .execute("SELECT path FROM files WHERE sha1 = ?", (sha1hash,))
+            .fetchall()
+        )
+
+    for (file_path,) in rows:
+        if is_verified(file_path, sha1hash):
+            return file_path
+
+    return None
+
+
+def record(file_path: str, sha1hash: str) -> None:
+    """
+    Remembers that the file, as it is now on disk, matches sha1hash
+    """
+    st = stat(file_path)
+
+    with _lock:
+        connection = _get_connection()
+        connection.execute(
+            "INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?)",
+            (path.abspath(file_path), st.st_size, st.st_mtime_ns, sha1hash),
+        )
+        connection.commit()
+
+
+def forget(file_path: str) -> None:
+    with _lock:
+        connection = _get_connection()
+        connection.execute(
+            "DELETE FROM files WHERE path = ?", (path.abspath(file_path),)
+        )
+        connection.commit()
+
+
+def forget_many(file_paths: list[str]) -> None:
+    with _lock:
+        connection = _get_connection()
+        connection.executemany(
+            "DELETE FROM files WHERE path = ?",
+            ((path.abspath(file_path),) for file_path in file_paths),
+        )
+        connection.commit()
@@ -2,13 +2,14 @@
 #
 # SPDX-License-Identifier: GPL-3.0-only
 
+from threading import Thread
 from tkinter import messagebox
 
 from customtkinter import CTkButton, CTkFrame, CTkInputDialog
 
 from ice_launcher import views
 from ice_launcher.components.heading import Heading
-from ice_launcher.lib import instances
+from ice_launcher.lib import instances, integrity
 
 
 class EditInstance(CTkFrame):
@@ -42,6 +43,13 @@ class EditInstance(CTkFrame):
         )
         delete_button.grid(row=0, column=2, pady=10, padx=10, sticky="nse")
 
+        self.repair_button = CTkButton(
+            master=button_bar,
+            text="Repair 🩹",
+            command=self.repair_instance,
+        )
+        self.repair_button.grid(row=0, column=3, pady=10, padx=10, sticky="nse")
+
     def rename_instance(self):
         dialog = CTkInputDialog(
             master=None,
@@ -53,6 +61,32 @@ class EditInstance(CTkFrame):
             instances.rename(self.heading.label.text, new_name)
             self.heading.label.configure(text=new_name)
 
+    def repair_instance(self) -> None:
+        instance_name = self.heading.label.text
+        version_id = instances.read_info(instance_name).minecraft_version
+        self.repair_button.configure(state="disabled", text="Repairing...")
+
+        def repair():
+            try:
+                report = integrity.repair_version(version_id)
+            except Exception as e:
+                message = f"Repair failed: {e}"
+            else:
+                message = (
+                    f"Checked {report.checked} files, repaired {len(report.failed)}."
+                )
+                if not report.is_jre_valid:
+                    message += " The JRE was missing and has been installed again."
+
+            # Widgets are only touched from the GUI thread.
+            self.after(0, lambda: self.repair_done(message))
+
+        Thread(target=repair).start()
+
+    def repair_done(self, message: str) -> None:
+        self.repair_button.configure(state="normal", text="Repair 🩹")
+        messagebox.showinfo("Repair Instance", message)
+
     def done(self):
         self.master.open_page(None, views.Instances(master=self.master))  # type: ignore
 
@@ -5,7 +5,9 @@
 from threading import Thread
 
 from customtkinter import (
+    BooleanVar,
     CTkButton,
+    CTkCheckBox,
     CTkComboBox,
     CTkEntry,
     CTkFrame,
@@ -15,10 +17,33 @@ from customtkinter import (
 )
 
 from ice_launcher.components.heading import Heading
-from ice_launcher.lib import ProgressCallbacks, instances, minecraft_versions
+from ice_launcher.lib import instances, minecraft_versions
+from ice_launcher.lib.progress import ProgressAggregator, ProgressSample
 
 from .instances import Instances
 
+PROGRESS_REFRESH_INTERVAL = 100  # ms
+SEARCH_DELAY = 150  # ms
+MAX_VISIBLE_VERSIONS = 50
+VERSION_TYPES = {
+    "release": "Releases",
+    "snapshot": "Snapshots",
+    "old_beta": "Beta",
+    "old_alpha": "Alpha",
+}
+
+
+def _format_progress(sample: ProgressSample) -> str:
+    text = sample.status
+    if sample.bytes_per_second:
+        text += f"\n{sample.bytes_per_second / 1024 / 1024:.1f} MB/s"
+        text += f", {sample.files_per_second:.0f} files/s"
+    if sample.eta is not None:
+        minutes, seconds = divmod(int(sample.eta), 60)
+        text += f", {minutes}:{seconds:02d} left"
+
+    return text
+
 
 class NewInstance(CTkFrame):
     def __init__(self, master) -> None:
@@ -32,31 +57,84 @@ class NewInstance(CTkFrame):
         self.instance_name = CTkEntry(master=self, placeholder_text="My new instance")
         self.instance_name.grid(row=1, column=0, pady=10, padx=20, sticky="nswe")
 
+        self.version_search = CTkEntry(master=self, placeholder_text="Search versions")
+        self.version_search.grid(row=2, column=0, pady=10, padx=20, sticky="nswe")
+        self.version_search.bind("<KeyRelease>", self.schedule_search)
+        self.search_job = None
+
+        type_filters = CTkFrame(master=self, fg_color="transparent")
+        type_filters.grid(row=3, column=0, pady=0, padx=20, sticky="nswe")
+        self.version_types = {}
+        for column, (version_type, label) in enumerate(VERSION_TYPES.items()):
+            variable = BooleanVar(value=version_type == "release")
+            self.version_types[version_type] = variable
+            checkbox = CTkCheckBox(
+                master=type_filters,
+                text=label,
+                variable=variable,
+                command=self.update_version_selector,
+            )
+            checkbox.grid(row=0, column=column, pady=0, padx=(0, 10))
+
         self.version = StringVar()
         self.version_selector = CTkComboBox(master=self, variable=self.version)
-        self.version_selector.grid(row=2, column=0, pady=10, padx=20, sticky="nswe")
+        self.version_selector.grid(row=4, column=0, pady=10, padx=20, sticky="nswe")
 
         # empty row as spacing
-        self.grid_rowconfigure(3, weight=1)
+        self.grid_rowconfigure(5, weight=1)
 
         self.create_button = CTkButton(
             master=self,
             text="Create",
             command=self.create_instance,
         )
-        self.create_button.grid(row=4, column=0, pady=(10, 20), padx=20, sticky="swe")
+        self.create_button.grid(row=6, column=0, pady=(10, 20), padx=20, sticky="swe")
 
+        self.version_index = None
         Thread(target=self.update_versions).start()
 
     def update_versions(self) -> None:
-        self.version_manifest = minecraft_versions.fetch_manifest()
-        self.version_ids = [version.id for version in self.version_manifest.versions]
-        self.version_selector.configure(values=self.version_ids)
-        self.version.set(self.version_manifest.latest.release)
+        version_index = minecraft_versions.fetch_version_index()
+
+        # Widgets are only touched from the GUI thread.
+        self.after(0, lambda: self.show_versions(version_index))
+
+    def show_versions(self, version_index: minecraft_versions.VersionIndex) -> None:
+        self.version_index = version_index
+        self.update_version_selector()
+        self.version.set(version_index.latest.release)
+
+    def schedule_search(self, event=None) -> None:
+        # Searches once typing pauses, not on every key.
+        if self.search_job is not None:
+            self.after_cancel(self.search_job)
+        self.search_job = self.after(SEARCH_DELAY, self.update_version_selector)
+
+    def update_version_selector(self) -> None:
+        self.search_job = None
+        if self.version_index is None:
+            return
+
+        types = [
+            version_type
+            for version_type, variable in self.version_types.items()
+            if variable.get()
+        ]
+        matches = self.version_index.search(
+            self.version_search.get(), types, limit=MAX_VISIBLE_VERSIONS
+        )
+
+        # Only the best matches are rendered in the dropdown.
+        version_ids = [version.id for version in matches]
+        self.version_selector.configure(values=version_ids)
+        if version_ids and self.version.get() not in version_ids:
+            self.version.set(version_ids[0])
 
     def create_instance(self) -> None:
         instance_name = self.instance_name.get()
-        version_id = self.version.get()
+        version = self.version_index and self.version_index.get(self.version.get())
+        if version is None:
+            return
 
         for widget in self.winfo_children():
             widget.destroy()
@@ -76,43 +154,41 @@ class NewInstance(CTkFrame):
 
         self.grid_rowconfigure(4, weight=1)
 
-        self.current_value = 0
-        self.max_progress = 0
+        # Workers only update the aggregator, the progress bar is refreshed
+        # from the GUI thread.
+        self.progress = ProgressAggregator()
+        self.after(PROGRESS_REFRESH_INTERVAL, self.update_progress)
 
-        def set_status(status: str) -> None:
-            self.status_label.configure(text=status)
-
-        def increment_value_by(value: int) -> None:
-            self.current_value += value
-            self.progress_bar.set(self.current_value / self.max_progress)
+        def new_instance():
+            try:
+                instances.new(
+                    instance_name,
+                    version,
+                    self.progress.get_callbacks(),
+                )
+            except Exception as e:
+                message = f"Instance creation failed: {e}"
+                self.after(0, lambda: self.creation_failed(message))
+                return
+
+            # Widgets are only touched from the GUI thread.
+            self.after(0, self.creation_done)
 
-        def set_max(value: int) -> None:
-            self.max_progress = value
+        Thread(target=new_instance).start()
 
-        def reset() -> None:
-            self.current_value = 0
-            self.max_progress = 0
-            self.progress_bar.set(0)
+    def creation_done(self) -> None:
+        self.master.open_page(None, Instances(master=self.master))  # type: ignore
 
-        callbacks = ProgressCallbacks(
-            set_max=set_max,
-            increment_value_by=increment_value_by,
-            set_status=set_status,
-            reset=reset,
-        )
+    def creation_failed(self, message: str) -> None:
+        self.progress.set_status(message)
 
-        def new_instance():
-            version = next(
-                version
-                for version in self.version_manifest.versions
-                if version.id == version_id
-            )
+    def update_progress(self) -> None:
+        if not self.winfo_exists():
+            return
 
-            instances.new(
-                instance_name,
-                version,
-                callbacks,
-            )
-            self.master.open_page(None, Instances(master=self.master))  # type: ignore
+        sample = self.progress.sample()
+        self.progress_bar.set(sample.fraction)
+        if sample.status:
+            self.status_label.configure(text=_format_progress(sample))
 
-        Thread(target=new_instance).start()
+        self.after(PROGRESS_REFRESH_INTERVAL, self.update_progress)